@@ -1,5 +1,18 @@
-from docassemble.base.util import log, word, DADict, DAList, DAObject, DAFile, DAFileCollection, DAFileList, defined, value, pdf_concatenate, DAOrderedDict, action_button_html, include_docx_template
+from docassemble.base.util import log, word, DADict, DAList, DAObject, DAFile, DAFileCollection, DAFileList, defined, value, pdf_concatenate, DAOrderedDict, action_button_html, include_docx_template, path_and_mimetype, user_info
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import bisect
+import functools
+import itertools
+import hashlib
+import json
+import keyword
+import os
 import re
+import threading
+import time
+import zipfile
 
 def label(dictionary):
   try:
@@ -30,25 +43,947 @@ def html_safe_str( the_string ):
   """
   return re.sub( r'[^A-Za-z0-9]+', '_', the_string )
 
-def table_row( obj, key='final' ):
+# Styles for the view/download tables, returned by ALDocumentBundle.table_css()
+TABLE_CSS = '''<style>\n
+    .al_table_css_sibling + div thead {
+      display: none;
+    }
+
+    .al_table_css_sibling + div td {
+      padding: .3em;
+      vertical-align: text-top;
+    }
+    td.text-left:first-child {
+      width: 1em;
+      padding-left: .5em;
+    }
+    .al_table_css_sibling + div td.text-left + td.text-right {
+      width: 5em;
+    }
+    .al_table_css_sibling + div td.text-right {
+      width: 7em;
+    }
+
+    .al_table_css_sibling + div a {
+      margin: 0em;
+    }
+  </style>'''
+
+# The attachment keys an ALDocument is expected to have
+DOCUMENT_KEYS = ('final', 'preview')
+
+def document_key(key):
+  """
+  Return key if it is one of DOCUMENT_KEYS, otherwise raise a ValueError.
+  For keys that come from outside the interview, e.g. in an action's
+  arguments, so they can't be used to look up (and gather) other attributes.
+  """
+  if key not in DOCUMENT_KEYS:
+    raise ValueError("Unknown document key " + repr(key))
+  return key
+
+def batch_document(name):
+  """
+  Return the ALDocumentBundle or ALDocument in the interview variable called
+  name, for the al_batch_assemble event. name comes from the API caller, so
+  only a plain variable name that is already defined is accepted; anything
+  else raises a ValueError.
+  """
+  if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name) or name.startswith('_') or not defined(name):
+    raise ValueError("Unknown bundle " + repr(name))
+  document = value(name)
+  if not isinstance(document, (ALDocumentBundle, ALDocument)):
+    raise ValueError(name + ' is not an ALDocumentBundle or ALDocument')
+  return document
+
+def table_row( obj, key='final', lazy=False ):
   """
   Return a string of html that is one row of a table containing
   the `.as_pdf()` contents of an AL object and it's interaction buttons
+  
+  If lazy is True, the buttons link to the `al_download_pdf` event in
+  al_document.yml instead, so the PDF is only assembled when a button is clicked.
+  """
+  if lazy:
+    view_url = obj.url_action('al_download_pdf', key=key)
+    download_url = obj.url_action('al_download_pdf', key=key, attachment=True)
+  else:
+    pdf = obj.as_pdf(key=key)
+    view_url = pdf.url_for()
+    download_url = pdf.url_for(attachment=True)
+  
+  return ''.join([
+    '\n\t<tr>',
+    '\n\t\t<td><i class="fas fa-file"></i>&nbsp;&nbsp;</td>',
+    '\n\t\t<td>', obj.title, '&nbsp;&nbsp;</td>',
+    '\n\t\t<td>', action_button_html( view_url, label=word("View"), icon="eye", color="secondary" ), '&nbsp;&nbsp;</td>',
+    '\n\t\t<td>', action_button_html( download_url, label=word("Download"), icon="download", color="primary" ), '</td>',
+    '\n\t</tr>',
+  ])
+
+def file_fingerprint(item):
+  """
+  Return a hashable fingerprint of something that can be passed to
+  pdf_concatenate: a DAFile, DAFileList, DAFileCollection, path or list of those.
+  
+  Docassemble gives every file it assembles or stores its own number, so a
+  re-assembled attachment always gets a new fingerprint. A path is identified
+  by its modification time and size. Returns None if any of the files can't
+  be identified this way, so the result must not be cached.
+  """
+  if isinstance(item, DAFileCollection):
+    # e.g. an attachment with only a DOCX version
+    files = [file_fingerprint(the_file) for name, the_file in sorted(item.__dict__.items()) if isinstance(the_file, DAFile)]
+    if not files or None in files:
+      return None
+    return ('collection',) + tuple(files)
+  if isinstance(item, DAFileList) or isinstance(item, (list, tuple)):
+    elements = tuple(file_fingerprint(element) for element in item)
+    if None in elements:
+      return None
+    return ('list',) + elements
+  if isinstance(item, DAFile):
+    if not hasattr(item, 'number'):
+      return None
+    return ('file', item.number)
+  try:
+    stat = os.stat(str(item))
+  except OSError:
+    return None
+  return ('path', str(item), stat.st_mtime_ns, stat.st_size)
+
+class ALCache(object):
+  """
+  Thread-safe in-memory cache with a size limit and a time to live. Used for
+  concatenated PDFs (`pdf_cache`), rendered download tables (`table_cache`)
+  and the errors of failed background jobs.
+  
+  Entries are evicted least recently used first once there are more than
+  `max_entries`, and are ignored once they are older than `max_age` seconds.
+  get() and put() ignore a cache_key of None, so a caller can pass along
+  "not cacheable" without checking.
+  
+  make_key() builds a key for a list of files from a fingerprint of the files
+  (see file_fingerprint()), the attachment key ('final'/'preview') and the output
+  filename. Because the fingerprint includes docassemble's file numbers, a hit
+  can only happen for the same assembled files, so repeat views of an unchanged
+  bundle return the existing DAFile instead of running pdf_concatenate again.
+  It returns None for inputs that file_fingerprint() can't identify.
+  """
+  def __init__(self, max_entries=256, max_age=3600):
+    self.max_entries = max_entries
+    self.max_age = max_age
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+  
+  def make_key(self, inputs, key='final', filename=''):
+    fingerprint = file_fingerprint(inputs)
+    if fingerprint is None:
+      return None
+    return hashlib.sha1(repr((fingerprint, key, filename)).encode('utf-8')).hexdigest()
+  
+  def get(self, cache_key):
+    """
+    Return the cached DAFile for cache_key, or None.
+    """
+    if cache_key is None:
+      return None
+    with self._lock:
+      entry = self._entries.get(cache_key)
+      if entry is not None and time.time() - entry[0] > self.max_age:
+        del self._entries[cache_key]
+        self.evictions += 1
+        entry = None
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(cache_key)
+      self.hits += 1
+      return entry[1]
+  
+  def put(self, cache_key, pdf):
+    if cache_key is None:
+      return
+    with self._lock:
+      self._entries[cache_key] = (time.time(), pdf)
+      self._entries.move_to_end(cache_key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+  
+  def __contains__(self, cache_key):
+    """
+    Check for a fresh entry without counting a hit or miss.
+    """
+    if cache_key is None:
+      return False
+    with self._lock:
+      entry = self._entries.get(cache_key)
+      return entry is not None and time.time() - entry[0] <= self.max_age
+  
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+  
+  def stats(self):
+    """
+    Return a dictionary with the hit/miss/eviction counters and current size.
+    """
+    with self._lock:
+      return {'hits': self.hits, 'misses': self.misses,
+              'evictions': self.evictions, 'size': len(self._entries)}
+
+# Concatenated PDFs (see concatenate_cached())
+pdf_cache = ALCache()
+
+# Rendered download tables (see ALDocumentBundle.cached_table())
+table_cache = ALCache()
+
+_timing_state = threading.local()
+
+def start_timing():
+  """
+  Start recording timing spans for the current request (thread). Any
+  report that was being recorded on this thread is discarded.
+  
+  docassemble reuses threads across requests and users, so recording must be
+  stopped with stop_timing() before the request ends. Prefer
+  recording_timing(), which does that for you.
+  """
+  _timing_state.root = {'name': 'request', 'calls': 1, 'seconds': 0.0, 'bytes': 0, 'children': OrderedDict()}
+  _timing_state.start = time.perf_counter()
+  _timing_state.stack = [_timing_state.root]
+
+def stop_timing():
+  """
+  Stop recording and return the report, or None if timing was not started.
+  """
+  report = timing_report()
+  _timing_state.root = None
+  _timing_state.stack = None
+  return report
+
+@contextmanager
+def recording_timing():
+  """
+  Record timing spans for the block only. Yields a dictionary whose 'report'
+  is set to the finished report when the block exits, even on an error:
+  
+      with recording_timing() as timing:
+        bundle.as_pdf()
+      log(json.dumps(timing['report']))
+  
+  Inside a recording that is already running, the spans are added to it,
+  and it is left running.
+  """
+  result = {'report': None}
+  if getattr(_timing_state, 'stack', None):
+    try:
+      yield result
+    finally:
+      result['report'] = timing_report()
+    return
+  start_timing()
+  try:
+    yield result
+  finally:
+    result['report'] = stop_timing()
+
+def timing_report():
+  """
+  Return the timing recorded since start_timing() as nested dictionaries with
+  the name, number of calls, total seconds, bytes of PDF produced and children
+  of each span. Repeated calls to the same method on the same object are combined.
+  """
+  root = getattr(_timing_state, 'root', None)
+  if root is None:
+    return None
+  root['seconds'] = time.perf_counter() - _timing_state.start
+  return _span_report(root)
+
+def _span_report(span):
+  return {'name': span['name'], 'calls': span['calls'], 'seconds': span['seconds'], 'bytes': span['bytes'],
+          'children': [_span_report(child) for child in span['children'].values()]}
+
+@contextmanager
+def timing_span(name):
+  """
+  Time the block as a span called name, nested under the current span.
+  Yields the span dictionary, or None when timing was not started.
+  """
+  stack = getattr(_timing_state, 'stack', None)
+  if not stack:
+    yield None
+    return
+  parent = stack[-1]
+  span = parent['children'].get(name)
+  if span is None:
+    span = {'name': name, 'calls': 0, 'seconds': 0.0, 'bytes': 0, 'children': OrderedDict()}
+    parent['children'][name] = span
+  span['calls'] += 1
+  stack.append(span)
+  start = time.perf_counter()
+  try:
+    yield span
+  finally:
+    span['seconds'] += time.perf_counter() - start
+    stack.pop()
+
+def timed(name):
+  """
+  Decorator that records each call of a method as a timing span called
+  name plus the object's instanceName, and the size of any DAFile it returns.
+  Costs a single attribute check when timing was not started.
+  """
+  def decorator(method):
+    @functools.wraps(method)
+    def wrapper(self, *pargs, **kwargs):
+      if not getattr(_timing_state, 'stack', None):
+        return method(self, *pargs, **kwargs)
+      with timing_span(name + ' ' + self.instanceName) as span:
+        result = method(self, *pargs, **kwargs)
+        if isinstance(result, DAFile):
+          span['bytes'] += file_size(result)
+        return result
+    return wrapper
+  return decorator
+
+def concatenate_cached(inputs, key='final', filename='file.pdf', stream_over_bytes=None):
+  """
+  Like pdf_concatenate(), but return the existing DAFile from `pdf_cache`
+  when the same input files were already concatenated to the same filename.
+  
+  If the inputs add up to more than stream_over_bytes, the PDF is built with
+  concatenate_streaming() instead of pdf_concatenate().
+  """
+  cache_key = pdf_cache.make_key(inputs, key=key, filename=filename)
+  pdf = pdf_cache.get(cache_key)
+  if pdf is None:
+    with timing_span('pdf_concatenate ' + filename) as span:
+      if stream_over_bytes is not None and sum(file_size(item) for item in flatten_files(inputs)) > stream_over_bytes:
+        pdf = concatenate_streaming(inputs, filename=filename)
+      else:
+        pdf = pdf_concatenate(inputs, filename=filename)
+      if span is not None:
+        span['bytes'] += file_size(pdf)
+    pdf_cache.put(cache_key, pdf)
+  return pdf
+
+def _pdf_reader_writer():
+  try:
+    from PyPDF2 import PdfReader, PdfWriter
+  except ImportError:
+    from PyPDF2 import PdfFileReader as PdfReader, PdfFileWriter as PdfWriter
+  return PdfReader, PdfWriter
+
+def page_thumbnails(pdf):
+  """
+  Return a list of PNG DAFiles, one "screen" sized image for each page of
+  pdf, for showing inline. Cached in `pdf_cache` like concatenate_cached().
+  """
+  cache_key = pdf_cache.make_key([pdf], key='thumbnails', filename=pdf.filename)
+  thumbnails = pdf_cache.get(cache_key)
+  if thumbnails is not None:
+    return thumbnails
+  PdfReader = _pdf_reader_writer()[0]
+  thumbnails = []
+  for page in range(1, len(PdfReader(pdf.path()).pages) + 1):
+    thumbnail = DAFile()
+    thumbnail.initialize(extension='png')
+    thumbnail.copy_into(pdf.page_path(page, 'screen'))
+    thumbnail.commit()
+    thumbnails.append(thumbnail)
+  pdf_cache.put(cache_key, thumbnails)
+  return thumbnails
+
+def zip_files(files, filename='documents.zip'):
+  """
+  Return a DAFile with a ZIP archive of the files. files can be a generator:
+  each file is added to the archive as soon as it is produced, and is copied
+  from disk in blocks, so memory use stays flat however many files there are.
+  Files with the same name are numbered, e.g. "motion (2).pdf".
+  """
+  archive = DAFile()
+  archive.initialize(filename=filename)
+  names = set()
+  with zipfile.ZipFile(archive.path(), 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+    for the_file in files:
+      base, extension = os.path.splitext(the_file.filename)
+      name = the_file.filename
+      number = 1
+      while name in names:
+        number += 1
+        name = base + ' (' + str(number) + ')' + extension
+      names.add(name)
+      zip_file.write(the_file.path(), arcname=name)
+  archive.commit()
+  return archive
+
+# Background jobs started by prerender(). Like `pdf_cache`, these only exist in
+# the process that started them.
+_prerender_jobs = {}
+_prerender_lock = threading.Lock()
+_prerender_executor = None
+# Errors of recently failed jobs, so prerender_status() can report them
+_prerender_errors = ALCache(max_entries=256, max_age=600)
+
+def prerender(inputs, key='final', filename='file.pdf', stream_over_bytes=None, executor=None):
+  """
+  Start concatenate_cached() for the inputs in the background, so a later
+  call with the same inputs finds the PDF in `pdf_cache`. Returns the cache key,
+  or None (and does nothing) if the inputs can't be cached.
+  
+  executor can be anything with a concurrent.futures style submit() method;
+  by default a small in-process thread pool is used. Either way the PDF is
+  only found by later requests served by this same process. The job runs
+  with in_thread_context(); see there for what has been tested.
+  """
+  global _prerender_executor
+  cache_key = pdf_cache.make_key(inputs, key=key, filename=filename)
+  if cache_key is None:
+    # The result couldn't be found in the cache later
+    return None
+  with _prerender_lock:
+    if cache_key in pdf_cache or cache_key in _prerender_jobs:
+      return cache_key
+    if executor is None:
+      if _prerender_executor is None:
+        _prerender_executor = ThreadPoolExecutor(max_workers=2)
+      executor = _prerender_executor
+    job = executor.submit(in_thread_context(concatenate_cached), inputs, key=key, filename=filename, stream_over_bytes=stream_over_bytes)
+    _prerender_jobs[cache_key] = job
+  job.add_done_callback(functools.partial(_finish_prerender, cache_key))
+  return cache_key
+
+def _finish_prerender(cache_key, job):
+  with _prerender_lock:
+    if job.exception() is not None:
+      _prerender_errors.put(cache_key, job.exception())
+    if _prerender_jobs.get(cache_key) is job:
+      del _prerender_jobs[cache_key]
+
+def prerendered(cache_key):
+  """
+  Return the PDF of the job prerender() started for cache_key, waiting for it
+  if it is still running, or None if there is no such job (or it failed).
+  """
+  with _prerender_lock:
+    job = _prerender_jobs.get(cache_key)
+  if job is None:
+    return pdf_cache.get(cache_key)
+  try:
+    return job.result()
+  except Exception:
+    return None
+
+def prerender_status(cache_key):
+  """
+  Return 'ready', 'pending', 'failed' or 'not started' for a cache key
+  returned by prerender().
+  """
+  if cache_key is None:
+    return 'not started'
+  if cache_key in pdf_cache:
+    return 'ready'
+  with _prerender_lock:
+    job = _prerender_jobs.get(cache_key)
+    if job is not None and not job.done():
+      return 'pending'
+    if _prerender_errors.get(cache_key) is not None:
+      return 'failed'
+  if job is not None:
+    # Finished, but _finish_prerender() hasn't run yet
+    return 'failed' if job.exception() is not None else 'ready'
+  return 'not started'
+
+def flatten_files(inputs):
+  """
+  Return a flat list of the individual files in a (possibly nested) list of
+  DAFiles, DAFileLists, DAFileCollections and paths.
+  """
+  files = []
+  stack = [inputs]
+  while stack:
+    item = stack.pop()
+    if isinstance(item, DAFileList) or isinstance(item, (list, tuple)):
+      stack.extend(reversed(list(item)))
+    else:
+      files.append(item)
+  return files
+
+def file_size(item):
+  """
+  Return the size in bytes of a DAFile, DAFileCollection or path, or 0 if it
+  can't be found.
+  """
+  try:
+    if isinstance(item, DAFileCollection):
+      item = item.pdf
+    if isinstance(item, DAFile):
+      return os.path.getsize(item.path())
+    return os.path.getsize(str(item))
+  except:
+    return 0
+
+def stored_file(owner, name, cache_key, build):
+  """
+  Return the file(s) that build() makes for cache_key, keeping them on owner
+  (an ALDocument or bundle, so in the interview answers) under name as well
+  as in `pdf_cache`. A request served by another process then reuses them
+  instead of building new ones.
+  """
+  stored = getattr(owner, '_stored_files', {}).get(name)
+  if cache_key is not None and stored is not None and stored[0] == cache_key:
+    if cache_key not in pdf_cache:
+      pdf_cache.put(cache_key, stored[1])
+    return stored[1]
+  result = pdf_cache.get(cache_key)
+  if result is None:
+    result = build()
+    pdf_cache.put(cache_key, result)
+  if cache_key is not None:
+    if not hasattr(owner, '_stored_files'):
+      owner._stored_files = dict()
+    owner._stored_files[name] = (cache_key, result)
+  return result
+
+def input_path(item):
+  """
+  Return the path of a DAFile, of a DAFileCollection's PDF (or DOCX, if it
+  has no PDF) or of a path string.
+  """
+  if isinstance(item, DAFileCollection):
+    item = item.pdf if hasattr(item, 'pdf') else item.docx
+  if isinstance(item, DAFile):
+    return item.path()
+  return str(item)
+
+def concatenate_streaming(inputs, filename='file.pdf', max_pages=None, skip_images=False):
+  """
+  Like pdf_concatenate(), but the PDF is written to the new DAFile's path one
+  page at a time (see pdf_stream.py), so memory use doesn't grow with the size
+  of the bundle. At most max_pages pages are kept; inputs after that aren't
+  read at all. If skip_images is True, images are replaced with blank ones.
+  
+  Inputs that aren't PDFs yet (e.g. a DOCX) are converted one at a time with
+  pdf_concatenate() first.
+  """
+  from .pdf_stream import StreamingPDFWriter, is_pdf
+  pdf = DAFile()
+  pdf.initialize(filename=filename)
+  with StreamingPDFWriter(pdf.path()) as writer:
+    for item in flatten_files(inputs):
+      if max_pages is not None and writer.page_count >= max_pages:
+        break
+      path = input_path(item)
+      if not is_pdf(path):
+        path = pdf_concatenate([item]).path()
+      writer.add_pdf(path, max_pages=None if max_pages is None else max_pages - writer.page_count, skip_images=skip_images)
+  pdf.commit()
+  return pdf
+
+_snapshot_state = threading.local()
+
+@contextmanager
+def field_snapshot():
+  """
+  Within this block, each addendum field's variable is looked up with
+  defined()/value() at most once. Nested blocks share the outermost snapshot,
+  which is discarded when it exits, so the next evaluation sees fresh answers.
+  """
+  if getattr(_snapshot_state, 'values', None) is not None:
+    yield
+    return
+  _snapshot_state.values = {}
+  try:
+    yield
+  finally:
+    _snapshot_state.values = None
+
+def invalidate_snapshot(field_name=None):
+  """
+  Forget the snapshotted value of field_name (or of every field) if a
+  variable is changed inside a field_snapshot() block.
+  """
+  values = getattr(_snapshot_state, 'values', None)
+  if values is None:
+    return
+  if field_name is None:
+    values.clear()
+  else:
+    values.pop(field_name, None)
+
+def snapshot_scope(method):
+  """
+  Decorator that runs the method inside a field_snapshot() block.
+  """
+  @functools.wraps(method)
+  def wrapper(*pargs, **kwargs):
+    with field_snapshot():
+      return method(*pargs, **kwargs)
+  return wrapper
+
+TextFit = namedtuple('TextFit', ['safe_value', 'overflow_value', 'split_offset'])
+
+@functools.lru_cache(maxsize=256)
+def fit_text(text, overflow_trigger, input_width=80, overflow_message="", preserve_newlines=False):
+  """
+  Split text for a field that holds overflow_trigger characters, in one pass.
+  
+  Returns a TextFit of:
+    - safe_value: what ALAddendumField.safe_value() displays in the field
+    - overflow_value: the rest of the text, for the addendum
+    - split_offset: where overflow_value starts in text
+  
+  The split is always measured with preserve_newlines=True, as
+  ALAddendumField.overflow_value() always has.
+  Results are cached per (text, overflow_trigger, input_width, overflow_message, preserve_newlines).
+  """
+  safe = _safe_text(text, overflow_trigger, input_width, overflow_message, preserve_newlines)
+  if preserve_newlines:
+    newline_safe = safe
+  else:
+    newline_safe = _safe_text(text, overflow_trigger, input_width, overflow_message, True)
+  split_offset = max(len(newline_safe) - max(len(overflow_message)-1, 0), 0)
+  return TextFit(safe, text[split_offset:], split_offset)
+
+def value_fingerprint(value):
+  """
+  Return a cheap fingerprint of everything about a field's value that
+  can change whether it overflows: the text of a string, or the length of a list.
+  
+  Uses hash(), which Python randomizes per process, so fingerprints are
+  only kept in memory and never saved with the interview answers.
+  """
+  if isinstance(value, str):
+    return (len(value), hash(value))
+  if isinstance(value, list) or isinstance(value, DAList):
+    return (len(value),)
+  return ()
+
+BundleEntry = namedtuple('BundleEntry', ['document', 'enabled', 'member', 'combined'])
+
+OverflowResult = namedtuple('OverflowResult', ['defined', 'overflows', 'split_offset', 'overflow_length'])
+
+def _safe_text(text, overflow_trigger, input_width, overflow_message, preserve_newlines):
+  # Handle simplest case first
+  if len(text) <= overflow_trigger and (text.count('\r') + text.count('\n')) == 0:
+    return text
+  
+  # Same estimate as ALAddendumField.max_lines()
+  max_lines = int(max(overflow_trigger - len(overflow_message),0) / input_width) + 1
+  max_chars = max(overflow_trigger - len(overflow_message),0)
+  
+  # If there are at least 2 lines, we can ignore overflow trigger.
+  # each line will be at least input_width wide
+  if preserve_newlines and max_lines > 1:
+    # Replace all new line characters with just \n. \r\n inserts two lines in a PDF
+    paras = re.sub(r"[\r\n]+|\r+|\n+",r"\n",text).rstrip().split('\n')
+    parts = []
+    line = 1
+    para = 0
+    while line <= max_lines and para < len(paras):
+      paragraph = paras[para]
+      # add the whole paragraph if less than width of input
+      if len(paragraph) <= input_width:
+        parts.append(paragraph)
+        parts.append("\n")
+        line += 1
+        para += 1
+      else:
+        # Keep taking the next input_width characters until we hit max_lines
+        # or we finish the paragraph
+        start = 0
+        while line <= max_lines and start < len(paragraph):
+          parts.append(paragraph[start:start + input_width])
+          start += input_width
+          line += 1
+        if start >= len(paragraph):
+          para += 1
+          parts.append("\n")
+    retval = "".join(parts)
+    # TODO: check logic here to only add overflow message when we exceed length
+    if len(paras) > para:
+      return retval.rstrip() + overflow_message # remove trailing newline before adding overflow message
+    return retval
+  
+  # Strip newlines from strings
+  if len(text) > overflow_trigger:
+    return re.sub(r"[\r\n]+|\r+|\n+"," ",text).rstrip()[:max_chars] + overflow_message
+  return re.sub(r"[\r\n]+|\r+|\n+"," ",text).rstrip()[:max_chars]
+
+def _state_without(cls, obj, transient):
+  """
+  Return a copy of obj's pickle state without the transient attributes. cls is
+  the class whose __getstate__() is calling, so subclasses don't recurse.
+  """
+  parent = super(cls, obj)
+  if hasattr(parent, '__getstate__'):
+    state = parent.__getstate__()
+  else:
+    state = obj.__dict__
+  state = dict(state or {})
+  for name in transient:
+    state.pop(name, None)
+  return state
+
+FieldSpec = namedtuple('FieldSpec', ['field_name', 'overflow_trigger', 'attributes'])
+
+_spec_cache = {}
+
+def load_overflow_spec(source):
+  """
+  Validate a list of overflow field specs in one pass and return it as a
+  tuple of FieldSpec(field_name, overflow_trigger, attributes) that
+  ALAddendumFieldDict.from_list() can load into any number of documents.
+  
+  source can be a list of dictionaries, or the path of a YAML or JSON file with
+  such a list (a package reference like "docassemble.MyPackage:data/sources/fields.yml"
+  works too). Files are parsed once per process and reused until they change.
+  
+  Each entry needs a field_name and an integer overflow_trigger; any other keys
+  (e.g., headers) are set as attributes of the field. Raises a ValueError that
+  lists every invalid entry.
+  """
+  if isinstance(source, tuple) and all(isinstance(entry, FieldSpec) for entry in source):
+    return source
+  if not isinstance(source, str):
+    return _validate_spec(source)
+  path = file_path(source)
+  cache_key = (path, os.path.getmtime(path))
+  if cache_key not in _spec_cache:
+    with open(path) as spec_file:
+      if path.lower().endswith('.json'):
+        data = json.load(spec_file)
+      else:
+        import yaml
+        data = yaml.safe_load(spec_file)
+    _spec_cache[cache_key] = _validate_spec(data)
+  return _spec_cache[cache_key]
+
+def file_path(source):
+  """
+  Return the file system path of a DAFile, a package reference like
+  "docassemble.MyPackage:data/sources/fields.yml", or a plain path.
+  """
+  if hasattr(source, 'path'):
+    return source.path()
+  if ':' in source and not os.path.isabs(source):
+    return path_and_mimetype(source)[0]
+  return source
+
+def _validate_spec(data):
+  specs = []
+  errors = []
+  seen = set()
+  for index, entry in enumerate(data):
+    if not isinstance(entry, dict):
+      errors.append("entry " + str(index) + " is not a dictionary")
+      continue
+    field_name = entry.get('field_name')
+    overflow_trigger = entry.get('overflow_trigger')
+    if not isinstance(field_name, str) or not field_name:
+      errors.append("entry " + str(index) + " needs a field_name")
+      continue
+    if field_name in seen:
+      errors.append("entry " + str(index) + " repeats the field_name " + field_name)
+      continue
+    if not isinstance(overflow_trigger, int) or isinstance(overflow_trigger, bool) or overflow_trigger < 0:
+      errors.append("entry " + str(index) + " (" + field_name + ") needs a non-negative integer overflow_trigger")
+      continue
+    seen.add(field_name)
+    attributes = tuple((name, attr_value) for name, attr_value in entry.items() if name not in ('field_name', 'overflow_trigger'))
+    specs.append(FieldSpec(field_name, overflow_trigger, attributes))
+  if errors:
+    raise ValueError("Invalid overflow field spec: " + "; ".join(errors))
+  return tuple(specs)
+
+# A variable name like users[0].name.first or x['key']
+_variable_name = re.compile(r"[A-Za-z][A-Za-z0-9_]*(\.[A-Za-z][A-Za-z0-9_]*|\[(\d+|'[^'\\]*'|\"[^\"\\]*\")\])*$")
+
+def is_variable_name(name):
+  """
+  Return True if name can be used as a docassemble variable, e.g.
+  "users[0].name.first", but not "Text Field 1" or "def".
+  """
+  if not _variable_name.match(name):
+    return False
+  unquoted = re.sub(r"'[^']*'|\"[^\"]*\"", '', name)
+  return not any(keyword.iskeyword(part) for part in re.findall(r'[A-Za-z][A-Za-z0-9_]*', unquoted))
+
+def row_values(row, columns):
+  """
+  Return the string value of each column (key or attribute name) of a row
+  from a list of dictionaries or objects, or "" where it is missing.
+  """
+  if isinstance(row, dict) or isinstance(row, DADict):        
+    return [str(row.get(column,'')) for column in columns]
+  values = []
+  for column in columns:
+    # don't trigger collecting attributes that are required to resolve 
+    # to a string
+    try:
+      values.append(str(getattr(row, column,'')))
+    except:
+      values.append("")
+  return values
+
+def jinja_escape(text):
+  """
+  Return text with its braces written as Jinja expressions, so that a
+  template that contains it shows it as it is instead of running it.
+  """
+  return re.sub(r'[{}]', lambda match: "{{ '" + match.group(0) + "' }}", text)
+
+# Attributes of DAObject rows that are never shown as table columns
+IGNORED_COLUMNS = {'has_nonrandom_instance_name','instanceName','attrList'}
+
+def sample_rows(rows, sample_size=1000):
+  """
+  Return all the rows, or for longer lists sample_size rows evenly spaced from
+  the first to the last.
+  """
+  if len(rows) <= sample_size:
+    return list(rows)
+  step = (len(rows) - 1) / float(sample_size - 1)
+  return [rows[int(round(index * step))] for index in range(sample_size)]
+
+def row_keys(row):
+  """
+  Return the keys of a dictionary row or the attribute names of an object row,
+  in the order they were added, or None for any other kind of row.
+  """
+  if isinstance(row, dict) or isinstance(row, DADict):
+    return row.keys()
+  if isinstance(row, DAObject):
+    return row.__dict__.keys()
+  return None
+
+def infer_columns(rows):
+  """
+  Return the union of the keys/attributes of the rows as a list of {key: key}
+  columns, in the order each one is first seen, or None if no row has any.
+  """
+  seen = OrderedDict()
+  for row in rows:
+    keys = row_keys(row)
+    if keys is not None:
+      for key in keys:
+        if key not in IGNORED_COLUMNS:
+          seen[key] = True
+  if not seen:
+    return None
+  return [{key:key} for key in seen]
+
+_render_state = threading.local()
+
+@contextmanager
+def render_plan():
+  """
+  Within this block, each document's file list and PDF is built at most once
+  for each key ('final'/'preview'), however many bundles include the document.
+  Also opens a field_snapshot(). Nested blocks share the outermost plan.
+  """
+  if getattr(_render_state, 'plan', None) is not None:
+    yield
+    return
+  _render_state.plan = {}
+  try:
+    with field_snapshot():
+      yield
+  finally:
+    _render_state.plan = None
+
+def render_scope(method):
+  """
+  Decorator that runs the method inside a render_plan() block.
+  """
+  @functools.wraps(method)
+  def wrapper(*pargs, **kwargs):
+    with render_plan():
+      return method(*pargs, **kwargs)
+  return wrapper
+
+def planned(method):
+  """
+  Decorator for methods that take a `key` ('final'/'preview'): inside a
+  render_plan() block, return the result from the first call for the
+  same object and key.
+  """
+  @functools.wraps(method)
+  def wrapper(self, *pargs, **kwargs):
+    plan = getattr(_render_state, 'plan', None)
+    if plan is None:
+      return method(self, *pargs, **kwargs)
+    the_key = (method.__name__, id(self), kwargs.get('key', pargs[0] if pargs else 'final'))
+    if the_key not in plan:
+      plan[the_key] = method(self, *pargs, **kwargs)
+    return plan[the_key]
+  return wrapper
+
+def _app_context_factory():
   """
-  pdf = obj.as_pdf(key=key)
+  Return a function that makes a new Flask app context for the app serving
+  the current request, or None outside of one (e.g., in tests).
+  """
+  try:
+    import flask
+  except ImportError:
+    return None
+  if not flask.has_app_context():
+    return None
+  return flask.current_app._get_current_object().app_context
+
+def in_thread_context(func):
+  """
+  Wrap func so that it runs with the calling thread's docassemble context.
+  
+  Docassemble keeps the current interview and user in thread-local storage,
+  and a new DAFile gets its file number from the database through the Flask
+  app, neither of which worker threads would otherwise see. The wrapper copies
+  the thread-local context and, when called while serving a request, runs func
+  in a new app context of the same app.
+  
+  Each call gets its own copy of the context's attributes, and the worker's
+  own context is restored afterwards, so a pooled thread doesn't keep it.
+  The objects they refer to (e.g., the interview answers) are still the
+  calling thread's, though, so func must only read them: here, it is only
+  used to concatenate files that were collected beforehand.
   
-  html = '\n\t<tr>'
-  html += '\n\t\t<td><i class="fas fa-file"></i>&nbsp;&nbsp;</td>'
-  html += '\n\t\t<td>' + obj.title + '&nbsp;&nbsp;</td>'
-  html += '\n\t\t<td>'
-  html += action_button_html( pdf.url_for(), label=word("View"), icon="eye", color="secondary" )
-  html += '&nbsp;&nbsp;</td>'
-  html += '\n\t\t<td>'
-  html += action_button_html( pdf.url_for(attachment=True), label=word("Download"), icon="download", color="primary" )
-  html += '</td>'
-  html += '\n\t</tr>'
+  This has only been tested with the stand-in runtime in local_runtime.py,
+  not on a docassemble server; use concurrent=False and don't call
+  start_prerender() if new files fail to save there.
+  """
+  try:
+    from docassemble.base.functions import this_thread
+  except ImportError:
+    return func
+  context = dict(this_thread.__dict__)
+  app_context = _app_context_factory()
+  def wrapper(*pargs, **kwargs):
+    saved = dict(this_thread.__dict__)
+    this_thread.__dict__.clear()
+    this_thread.__dict__.update(context)
+    try:
+      if app_context is None:
+        return func(*pargs, **kwargs)
+      with app_context():
+        return func(*pargs, **kwargs)
+    finally:
+      this_thread.__dict__.clear()
+      this_thread.__dict__.update(saved)
+  return wrapper
 
-  return html
+def pdf_filename(filename):
+  """
+  Return the filename with a .pdf ending, adding one if needed.
+  """
+  if filename.endswith('.pdf'):
+    return filename
+  return filename + '.pdf'
   
 class ALAddendumField(DAObject):
   """
@@ -62,6 +997,9 @@ class ALAddendumField(DAObject):
     - field_name->str represents the name of a docassemble variable
     - overflow_trigger->int
 
+  Optional attributes:
+    - input_width->int: characters per line, used to estimate line breaks (default 80)
+
   Optional/planned (not implemented yet):    
     - headers->dict(attribute: display label for table)
     - field_style->"list"|"table"|"string" (optional: defaults to "string")
@@ -69,7 +1007,13 @@ class ALAddendumField(DAObject):
   def init(self, *pargs, **kwargs):
     super(ALAddendumField, self).init(*pargs, **kwargs)
 
-  def overflow_value(self, preserve_newlines=False, input_width=80, overflow_message = ""):
+  def __getstate__(self):
+    # The cached columns() schema, overflow result and addendum file are
+    # rebuilt on demand, and would otherwise be saved with every field on every step
+    return _state_without(ALAddendumField, self, ('_columns_state', '_overflow_state', '_docx_state'))
+
+  @snapshot_scope
+  def overflow_value(self, preserve_newlines=False, input_width=None, overflow_message = ""):
     """
     Try to return just the portion of the variable (list-like object or string)
     that exceeds the overflow trigger. Otherwise, return empty string.
@@ -77,22 +1021,58 @@ class ALAddendumField(DAObject):
     If newlines are preserved, we will use a heuristic to estimate line breaks instead
     of using absolute character limit.
     """
-    last_char = max(len(self.safe_value(overflow_message = overflow_message, input_width=input_width, preserve_newlines=True)) - (max(len(overflow_message)-1,0)), 0)   
-    
-    if preserve_newlines and isinstance(self.value_if_defined(),str):
+    value = self.value_if_defined()
+    if isinstance(value, str):
       # start where the safe value ends
-      return self.value_if_defined()[last_char:]
-      
-    if isinstance(self.value_if_defined(),str):
-      return self.value_if_defined()[last_char:]
+      return fit_text(value, self.overflow_trigger, input_width=self.line_width(input_width), overflow_message=overflow_message, preserve_newlines=True).overflow_value
+    
+    return value[self.overflow_trigger:]
+
+  @snapshot_scope
+  def overflow_result(self):
+    """
+    Return an OverflowResult (defined, overflows, split_offset, overflow_length)
+    for this field, using the same defaults as overflow_value().
     
-    return self.value_if_defined()[self.overflow_trigger:]
+    The result is remembered together with a fingerprint of the value it was
+    computed from, and only recomputed once the value or trigger changes. It
+    is not saved with the interview answers.
+    """
+    if not self.is_defined():
+      return OverflowResult(False, False, 0, 0)
+    value = self.value_if_defined()
+    fingerprint = value_fingerprint(value) + (self.overflow_trigger, self.line_width())
+    state = getattr(self, '_overflow_state', None)
+    if state is not None and state[0] == fingerprint:
+      return OverflowResult(*state[1])
+    if isinstance(value, str):
+      fit = fit_text(value, self.overflow_trigger, input_width=self.line_width(), preserve_newlines=True)
+      result = OverflowResult(True, len(fit.overflow_value) > 0, fit.split_offset, len(fit.overflow_value))
+    elif isinstance(value, list) or isinstance(value, DAList):
+      overflow_length = max(len(value) - self.overflow_trigger, 0)
+      result = OverflowResult(True, overflow_length > 0, self.overflow_trigger, overflow_length)
+    else:
+      # We can't slice objects that are not lists or strings
+      result = OverflowResult(True, False, 0, 0)
+    self._overflow_state = (fingerprint, tuple(result))
+    return result
 
-  def max_lines(self, input_width=80, overflow_message_length=0):
+  def max_lines(self, input_width=None, overflow_message_length=0):
     """
     Estimate the number of rows in the field in the output document.
     """
-    return int(max(self.overflow_trigger-overflow_message_length,0) / input_width) + 1
+    return int(max(self.overflow_trigger-overflow_message_length,0) / self.line_width(input_width)) + 1
+  
+  def line_width(self, input_width=None):
+    """
+    Return input_width if given, otherwise the field's input_width attribute
+    (e.g., from ALAddendumFieldDict.from_pdf_template()), or 80 characters.
+    """
+    if input_width is not None:
+      return input_width
+    if hasattr(self, 'input_width'):
+      return self.input_width
+    return 80
         
   def value(self):    
     """
@@ -102,58 +1082,17 @@ class ALAddendumField(DAObject):
     """
     return self.value_if_defined()
     
-  def safe_value(self, overflow_message = "", input_width=80, preserve_newlines=False):
+  @timed('safe_value')
+  @snapshot_scope
+  def safe_value(self, overflow_message = "", input_width=None, preserve_newlines=False):
     """
     Try to return just the portion of the variable
     that is _shorter than_ the overflow trigger. Otherwise, return empty string.
     """
     
-    # Handle simplest case first
     value = self.value_if_defined()
-    if isinstance(value, str) and len(value) <= self.overflow_trigger and (value.count('\r') + value.count('\n')) == 0:
-      return value
-    
-    max_lines = self.max_lines(input_width=input_width,overflow_message_length=len(overflow_message))
-    max_chars = max(self.overflow_trigger - len(overflow_message),0)
-        
-    # If there are at least 2 lines, we can ignore overflow trigger.
-    # each line will be at least input_width wide
-    if preserve_newlines and max_lines > 1:
-      if isinstance(value, str):
-        # Replace all new line characters with just \n. \r\n inserts two lines in a PDF
-        value = re.sub(r"[\r\n]+|\r+|\n+",r"\n",value).rstrip()
-        line = 1
-        retval = ""
-        paras = value.split('\n')
-        para = 0
-        while line <= max_lines and para < len(paras):
-          # add the whole paragraph if less than width of input
-          if len(paras[para]) <= input_width:
-            retval += paras[para] + "\n"
-            line += 1
-            para += 1
-          else:
-            # Keep taking the first input_width characters until we hit max_lines
-            # or we finish the paragraph
-            while line <= max_lines and len(paras[para]):
-              retval += paras[para][:input_width]
-              paras[para] = paras[para][input_width:]
-              line += 1
-            if not len(paras[para]):
-              para += 1
-              retval += "\n"
-        # TODO: check logic here to only add overflow message when we exceed length
-        if len(paras) > para:
-          return retval.rstrip() + overflow_message # remove trailing newline before adding overflow message
-        else:
-          return retval
-      
-    # Strip newlines from strings
     if isinstance(value, str):
-      if len(value) > self.overflow_trigger:
-        return re.sub(r"[\r\n]+|\r+|\n+"," ",value).rstrip()[:max_chars] + overflow_message
-      else:
-        return re.sub(r"[\r\n]+|\r+|\n+"," ",value).rstrip()[:max_chars]
+      return fit_text(value, self.overflow_trigger, input_width=self.line_width(input_width), overflow_message=overflow_message, preserve_newlines=preserve_newlines).safe_value
     
     # If the overflow item is a list or DAList
     if isinstance(value, list) or isinstance(value, DAList):
@@ -167,34 +1106,59 @@ class ALAddendumField(DAObject):
     Return the value of the field if it is defined, otherwise return an empty string.
     Addendum should never trigger docassemble's variable gathering.
     """
+    return self._lookup()[1]
+  
+  def is_defined(self):
+    """
+    Return True if the field's variable is defined.
+    """
+    return self._lookup()[0]
+  
+  def _lookup(self):
+    """
+    Return (is_defined, value), reusing the current field_snapshot() if there is one.
+    """
+    values = getattr(_snapshot_state, 'values', None)
+    if values is not None and self.field_name in values:
+      return values[self.field_name]
     if defined(self.field_name):
-      return value(self.field_name)
-    return ""
+      result = (True, value(self.field_name))
+    else:
+      result = (False, "")
+    if values is not None:
+      values[self.field_name] = result
+    return result
   
   def __str__(self):
     return str(self.value_if_defined())
     
+  @snapshot_scope
   def columns(self):
     """
     Return a list of the columns in this object.
+    
+    Without headers, the columns are the union of the keys/attributes of the
+    rows (or of a sample of up to 1000 rows of a longer list), in the order they
+    are first seen. The result is remembered until the list or the number of
+    attributes of a sampled row changes.
     """
     if hasattr(self, 'headers'):
       return self.headers
-    else:
-      # Use the first row as an exemplar
-      try:
-        first_value = self.value_if_defined()[0]
-
-        if isinstance(first_value, dict) or isinstance(first_value, DADict):
-          return list([{key:key} for key in first_value.keys()])
-        elif isinstance(first_value, DAObject):
-          attr_to_ignore = {'has_nonrandom_instance_name','instanceName','attrList'}
-          return [{key:key} for key in list( set(first_value.__dict__.keys()) - attr_to_ignore )]
-      except:
-        return None
+    try:
+      value = self.value_if_defined()
+      rows = sample_rows(value)
+      fingerprint = (id(value), len(value)) + tuple(len(row_keys(row) or ()) for row in rows)
+      state = getattr(self, '_columns_state', None)
+      if state is not None and state[0] == fingerprint:
+        return state[1]
+      columns = infer_columns(rows)
+      self._columns_state = (fingerprint, columns)
+      return columns
+    except:
       # None means the value has no meaningful columns we can extract
+      return None
 
-
+  @snapshot_scope
   def type(self):
     """
     list | object_list | other
@@ -206,12 +1170,14 @@ class ALAddendumField(DAObject):
       return "list"
     return "other"                         
 
+  @snapshot_scope
   def is_list(self):
     """
     Identify whether the field is a list, whether of objects/dictionaries or just plain variables.
     """
     return self.type() == 'object_list' or self.type() == 'list'
       
+  @snapshot_scope
   def is_object_list(self):
     """
     Identify whether the field represents a list of either dictionaries or objects.
@@ -226,54 +1192,101 @@ class ALAddendumField(DAObject):
     but you also do not need to use this output if you want to independently control the format
     of the table.
     """
-    if not self.columns():
-      if self.overflow_value():  
-        retval = "* "
-        retval += "\n* ".join(self.overflow_value())
-        return retval + "\n"
-      else:
-        return ""
+    return "".join(self.overflow_markdown_chunks())
+  
+  def overflow_markdown_chunks(self, chunk_size=500):
+    """
+    Generate the same markdown as overflow_markdown(), as strings of up to
+    chunk_size rows each, so a template can write out a very long
+    list without building the whole table in memory first.
+    """
+    with field_snapshot():
+      columns = self.columns()
+      overflow = self.overflow_value()
     
-    num_columns = len(self.columns())
+    if not columns:
+      for start in range(0, len(overflow), chunk_size):
+        yield "".join(["* " + item + "\n" for item in overflow[start:start + chunk_size]])
+      return
     
-    header = " | ".join([list(item.items())[0][1] for item in self.columns()])
-    header += "\n"
-    header += "|".join(["-----"] * num_columns)    
+    yield " | ".join([list(item.items())[0][1] for item in columns]) + "\n" + "|".join(["-----"] * len(columns)) + "\n"
     
-    flattened_columns = []
-    for column in self.columns():
-      flattened_columns.append(list(column.items())[0][0])
+    flattened_columns = [list(column.items())[0][0] for column in columns]
     
-    rows = "\n"
-    for row in self.overflow_value():
-      if isinstance(row, dict) or isinstance(row, DADict):        
-        row_values = []
-        for column in flattened_columns:        
-          row_values.append(str(row.get(column,'')))
-        rows += "|".join(row_values)
-      else:
-        row_values = []
-        for column in flattened_columns:
-          # don't trigger collecting attributes that are required to resolve 
-          # to a string
-          try:
-            row_values.append(str(getattr(row, column,'')))
-          except:
-            row_values.append("")
-        rows += "|".join(row_values)
-      rows += "\n"
-
-    return header + rows      
+    rows = []
+    for row in overflow:
+      rows.append("|".join(row_values(row, flattened_columns)) + "\n")
+      if len(rows) >= chunk_size:
+        yield "".join(rows)
+        rows = []
+    if rows:
+      yield "".join(rows)
   
-  def overflow_docx(self, path="docassemble.ALDocumentDict:data/templates/addendum_table.docx"):
+  @snapshot_scope
+  def overflow_docx(self, path=None):
     """
     Light wrapper around insert_docx_template() that inserts a formatted table into a docx
     file. If the object in the list is a plain string/int, it returns a bulleted list.
     
+    By default the table is built by overflow_docx_file(), with any Jinja
+    syntax in the answers escaped, because the inserted file is rendered as a
+    template. If path is given, that DOCX template is rendered with `columns`
+    and `rows` variables instead.
+    
     Using this method will not give you any control at all over the formatting, but you can directly
     call field.overflow_value() instead of using this method.
     """
+    if path is None:
+      return include_docx_template(self.overflow_docx_file(escape_jinja=True))
     return include_docx_template(path, columns=self.columns(), rows=self.overflow_value())
+  
+  def overflow_docx_file(self, filename='addendum_table.docx', escape_jinja=False):
+    """
+    Return a DAFile with a DOCX file that holds the overflow as a table (using
+    the columns() schema) or, for a list of plain values, as a bulleted list.
+    Set escape_jinja to True if the file will be rendered as a Jinja template.
+    
+    The table is written directly with python-docx in one batch instead of row by row
+    through a Jinja template, so it scales to tens of thousands of rows. The
+    file is kept on the field (but not saved with the interview answers) and
+    returned again while the text is unchanged.
+    """
+    with field_snapshot():
+      columns = self.columns()
+      overflow = self.overflow_value()
+    quote = jinja_escape if escape_jinja else str
+    if not columns:
+      header = None
+      rows = [[quote(str(item))] for item in overflow]
+    else:
+      flattened_columns = [list(column.items())[0][0] for column in columns]
+      header = [quote(str(list(column.items())[0][1])) for column in columns]
+      rows = [[quote(text) for text in row_values(row, flattened_columns)] for row in overflow]
+    fingerprint = hashlib.sha1(json.dumps([filename, header, rows]).encode('utf-8')).hexdigest()
+    saved = getattr(self, '_docx_state', None)
+    if saved is not None and saved[0] == fingerprint:
+      return saved[1]
+    import docx
+    document = docx.Document()
+    if header is None:
+      for row in rows:
+        document.add_paragraph(row[0], style='List Bullet')
+    else:
+      table = document.add_table(rows=len(rows) + 1, cols=len(header))
+      table.style = 'Table Grid'
+      # table.cell() and row.cells rebuild the whole cell grid on every call,
+      # so fill the table one column at a time
+      for index, column in enumerate(table.columns):
+        column_cells = column.cells
+        column_cells[0].text = header[index]
+        for row, cell in zip(rows, column_cells[1:]):
+          cell.text = row[index]
+    the_file = DAFile()
+    the_file.initialize(filename=filename)
+    document.save(the_file.path())
+    the_file.commit()
+    self._docx_state = (fingerprint, the_file)
+    return the_file
       
 class ALAddendumFieldDict(DAOrderedDict):
   """
@@ -288,6 +1301,7 @@ class ALAddendumFieldDict(DAOrderedDict):
   
   optional:
     - style: if set to "overflow_only" will only display the overflow text
+    - data: a field spec to load with from_list()
   """
   def init(self, *pargs, **kwargs):
     super(ALAddendumFieldDict, self).init(*pargs, **kwargs)  
@@ -296,7 +1310,7 @@ class ALAddendumFieldDict(DAOrderedDict):
     if not hasattr(self, 'style'):
       self.style = 'overflow_only'
     if hasattr(self, 'data'):
-      self.from_list(data)
+      self.from_list(self.data)
       del self.data      
   
   def initializeObject(self, *pargs, **kwargs):
@@ -307,22 +1321,111 @@ class ALAddendumFieldDict(DAOrderedDict):
     the_key = pargs[0]
     super().initializeObject(*pargs, **kwargs)
     self[the_key].field_name = the_key
+    self._reset_prefix_index()
+    return self[the_key]
+  
+  def __setitem__(self, the_key, the_value):
+    super(ALAddendumFieldDict, self).__setitem__(the_key, the_value)
+    self._reset_prefix_index()
+  
+  def __delitem__(self, the_key):
+    super(ALAddendumFieldDict, self).__delitem__(the_key)
+    self._reset_prefix_index()
+  
+  def _reset_prefix_index(self):
+    if hasattr(self, '_prefix_index'):
+      del self._prefix_index
+  
+  def __getstate__(self):
+    # The prefix index is rebuilt on demand
+    return _state_without(ALAddendumFieldDict, self, ('_prefix_index',))
   
   def from_list(self, data):
-    for entry in data:
-      new_field = self.initializeObject(entry['field_name'], ALAddendumField)
-      new_field.field_name = entry['field_name']
-      new_field.overflow_trigger = entry['overflow_trigger']
+    """
+    Add a field for each entry of a field spec: a list of dictionaries with a
+    field_name and overflow_trigger, a YAML/JSON file, or the result of
+    load_overflow_spec(), which can be shared by several documents.
+    The whole spec is validated before any field is added.
+    """
+    for spec in load_overflow_spec(data):
+      new_field = self.initializeObject(spec.field_name, ALAddendumField)
+      new_field.overflow_trigger = spec.overflow_trigger
+      for name, attr_value in spec.attributes:
+        setattr(new_field, name, attr_value)
+    self.gathered = True
+  
+  def from_pdf_template(self, template, field_map=None):
+    """
+    Add a field for each text field of a fillable PDF, with its overflow_trigger
+    and input_width estimated from the field's size and font. See pdf_triggers.py;
+    results are cached per template file, so the PDF is only parsed once.
+    
+    template can be a DAFile, package reference or path. field_map maps PDF field
+    names to docassemble variable names; if it is given, fields that are not
+    in it are skipped. Fields whose variable name isn't valid (see
+    is_variable_name()) are skipped too, and listed in the log.
+    """
+    from .pdf_triggers import pdf_overflow_triggers
+    spec = []
+    invalid = []
+    for field in pdf_overflow_triggers(file_path(template)):
+      if field_map is None:
+        field_name = field['field_name']
+      elif field['field_name'] in field_map:
+        field_name = field_map[field['field_name']]
+      else:
+        continue
+      if not is_variable_name(field_name):
+        invalid.append(field_name)
+        continue
+      spec.append({'field_name': field_name, 'overflow_trigger': field['overflow_trigger'], 'input_width': field['input_width']})
+    if invalid:
+      log("ALDocument: skipped PDF fields that aren't valid variable names (map them with field_map): " + ", ".join(repr(name) for name in invalid))
+    self.from_list(spec)
+  
+  def fields_with_prefix(self, prefix):
+    """
+    Return the fields for the variable prefix and everything inside it, in
+    the order they were added: e.g. users[0].name.first and users[0].address
+    for "users[0]", but not users[1].address or users_count.
+    
+    The fields are found by binary search in a sorted index of the field names.
+    The index is rebuilt after fields are set or deleted, and, in case they were
+    changed some other way (e.g., with pop()), whenever the number of fields changes.
+    """
+    if getattr(self, '_prefix_index', (None,))[0] != len(self):
+      self._prefix_index = (len(self), sorted((the_key, position) for position, the_key in enumerate(self.keys())))
+    index = self._prefix_index[1]
+    matches = []
+    for the_key, position in itertools.islice(index, bisect.bisect_left(index, (prefix,)), None):
+      if not the_key.startswith(prefix):
+        break
+      if len(the_key) == len(prefix) or the_key[len(prefix)] in '.[':
+        matches.append((position, the_key))
+    return [self[the_key] for position, the_key in sorted(matches)]
       
+  @timed('evaluate')
+  @snapshot_scope
+  def evaluate(self):
+    """
+    Check every field in one pass and return an ordered dictionary of
+    field_name -> OverflowResult (defined, overflows, split_offset, overflow_length).
+    
+    An addendum template can call this once and read the table instead
+    of asking each field again.
+    """
+    return OrderedDict((key, field.overflow_result()) for key, field in self.items())
+  
   def defined_fields(self, style='overflow_only'):
     """
     Return a filtered list of just the defined fields.
     If the "style" is set to overflow_only, only return the overflow values.
     """
+    results = self.evaluate()
     if style == 'overflow_only':
-      return [field for field in self.values() if defined(field.field_name) and len(field.overflow_value())]
+      return [field for key, field in self.items() if results[key].overflows]
     else:
-      return [field for field in self.values() if defined(field.field_name)]
+      return [field for key, field in self.items() if results[key].defined]
   
   def overflow(self):
     return self.defined_fields(style='overflow_only')
@@ -364,23 +1467,27 @@ class ALDocument(DADict):
     if not hasattr(self, 'default_overflow_message'):
       self.default_overflow_message = ''
  
+  @timed('as_pdf')
+  @planned
   def as_pdf(self, key='final'):
-    if self.filename.endswith('.pdf'):
-      ending = ''
-    else:
-      ending = '.pdf'
-    pdf = pdf_concatenate(self.as_list(key=key), filename=self.filename + ending)
+    inputs = self.as_list(key=key)
+    filename = pdf_filename(self.filename)
+    cache_key = pdf_cache.make_key(inputs, key=key, filename=filename)
+    pdf = stored_file(self, 'pdf:' + key, cache_key, lambda: concatenate_cached(inputs, key=key, filename=filename))
     pdf.title = self.title
     return pdf
 
+  @planned
+  @snapshot_scope
   def as_list(self, key='final'):
     if self.has_addendum and self.has_overflow():
       return [self[key], self.addendum]
     else:
       return [self[key]]
     
+  @timed('has_overflow')
   def has_overflow(self):
-    return len(self.overflow()) > 0
+    return any(result.overflows for result in self.overflow_fields.evaluate().values())
   
   def overflow(self):
     return self.overflow_fields.overflow()
@@ -415,73 +1522,322 @@ class ALDocumentBundle(DAList):
     - filename
     - title
   optional attribute: enabled
+  optional attribute: max_concatenate_bytes, to write the combined PDF to disk
+    page by page when its inputs add up to more than this many bytes, instead
+    of building it in memory (see concatenate_streaming())
+  optional attribute: use_combined_addendum, set to True to replace the addenda of
+    the individual documents with one `combined_addendum` attachment block for the
+    whole bundle, rendered once with one caption (see overflow_documents())
   """
   def init(self, *pargs, **kwargs):
     super(ALDocumentBundle, self).init(*pargs, **kwargs)
     self.auto_gather=False
     self.gathered=True
     # self.initializeAttribute('templates', ALBundleList)
+  
+  def __getstate__(self):
+    # The flat index signature uses id()s, which mean nothing after unpickling
+    return _state_without(ALDocumentBundle, self, ('_flat_index',))
     
+  @timed('as_pdf')
+  @planned
   def as_pdf(self, key='final'):
-    if self.filename.endswith('.pdf'):
-      ending = ''
-    else:
-      ending = '.pdf'
-    pdf = pdf_concatenate(self.as_flat_list(key=key), filename=self.filename + ending)
+    """
+    Return the enabled documents as one PDF. If start_prerender() is building
+    it in this process, that file is returned; otherwise it is built now. The
+    file is kept in the interview answers, so it is reused as long as the
+    documents don't change, whichever process serves the request.
+    """
+    inputs = self.as_flat_list(key=key)
+    filename = pdf_filename(self.filename)
+    cache_key = pdf_cache.make_key(inputs, key=key, filename=filename)
+    pdf = stored_file(self, 'pdf:' + key, cache_key,
+                            lambda: prerendered(cache_key) or concatenate_cached(inputs, key=key, filename=filename, stream_over_bytes=self._stream_over_bytes()))
+    pdf.title = self.title
+    return pdf
+  
+  def _stream_over_bytes(self):
+    if hasattr(self, 'max_concatenate_bytes'):
+      return self.max_concatenate_bytes
+    return None
+  
+  def preview(self, max_pages=None, skip_images=False):
+    """
+    Return the preview version of the bundle as one PDF. Pass max_pages to
+    only keep the first pages, and skip_images to leave out images, for a
+    smaller, faster preview. Only the pages that are kept are copied, and
+    documents after them aren't read (see concatenate_streaming()).
+    """
+    if not (max_pages or skip_images):
+      return self.as_pdf(key='preview')
+    inputs = self.as_flat_list(key='preview')
+    filename = pdf_filename(self.filename)
+    name = 'preview:' + str(max_pages) + ':' + str(skip_images)
+    pdf = stored_file(self, name, pdf_cache.make_key(inputs, key=name, filename=filename),
+                            lambda: concatenate_streaming(inputs, filename=filename, max_pages=max_pages, skip_images=skip_images))
     pdf.title = self.title
     return pdf
   
-  def preview(self):
-    return self.as_pdf(key='preview')
+  def preview_thumbnails(self, max_pages=3):
+    """
+    Return a list of PNG images of the first max_pages pages of the preview,
+    to show inline, e.g. `% for page in bundle.preview_thumbnails():`.
+    """
+    pdf = self.preview(max_pages=max_pages)
+    return stored_file(self, 'thumbnails:' + str(max_pages), pdf_cache.make_key([pdf], key='thumbnails', filename=pdf.filename),
+                             lambda: page_thumbnails(pdf))
+  
+  def start_prerender(self, key='final', executor=None):
+    """
+    Start building the combined PDF in the background, e.g. as soon as all
+    answers are final, so that as_pdf() on the download screen can return
+    it right away. Returns the status, as prerender_status() does.
+    
+    The documents and addenda are collected right away; only the concatenation
+    runs in the background. See prerender() for the executor argument.
+    
+    The background job runs in this process, and its file is only found by
+    requests that this process serves; elsewhere as_pdf() builds the PDF
+    itself (once, see as_pdf()).
+    """
+    cache_key = prerender(self.as_flat_list(key=key), key=key, filename=pdf_filename(self.filename), stream_over_bytes=self._stream_over_bytes(), executor=executor)
+    if not hasattr(self, '_prerender_keys'):
+      self._prerender_keys = dict()
+    self._prerender_keys[key] = cache_key
+    return self.prerender_status(key=key)
+  
+  def prerender_status(self, key='final'):
+    """
+    Return 'ready', 'pending', 'failed' or 'not started' for the combined PDF
+    as of the last start_prerender(). Nothing is assembled to find out.
+    """
+    cache_key = getattr(self, '_prerender_keys', {}).get(key)
+    stored = getattr(self, '_stored_files', {}).get('pdf:' + key)
+    if cache_key is not None and stored is not None and stored[0] == cache_key:
+      return 'ready'
+    return prerender_status(cache_key)
+  
+  def is_ready(self, key='final'):
+    return self.prerender_status(key=key) == 'ready'
+  
+  def flat_index(self):
+    """
+    Return a list of BundleEntry(document, enabled, member, combined) for every
+    ALDocument in this bundle and its nested bundles, in order. `member` is the
+    item of this bundle the document belongs to: the document itself or a nested
+    bundle. `combined` is the outermost nested bundle around the document that
+    has use_combined_addendum set to True, or None.
+    
+    A document in a nested bundle that has enabled set to False is listed as
+    disabled. The tree is walked iteratively, so deep nesting works, and each
+    nested bundle is only expanded once.
+    
+    The index is rebuilt on each call, because `enabled` can be changed by
+    interview logic at any time. But the same list object is returned while
+    membership and enabled states are unchanged, and flat_index_signature()
+    identifies that state for other caches.
+    """
+    entries = []
+    seen = set()
+    for member in self:
+      stack = [(member, True, None)]
+      while stack:
+        node, parent_enabled, combined = stack.pop()
+        if isinstance(node, ALDocumentBundle):
+          if id(node) in seen:
+            continue
+          seen.add(id(node))
+          node_enabled = parent_enabled and (not hasattr(node, 'enabled') or bool(node.enabled))
+          if combined is None and getattr(node, 'use_combined_addendum', False):
+            combined = node
+          stack.extend((child, node_enabled, combined) for child in reversed(list(node)))
+        else:
+          # Don't ask whether documents in a disabled bundle are enabled
+          entries.append(BundleEntry(node, parent_enabled and bool(node.enabled), member, combined))
+    signature = tuple((id(entry.document), entry.enabled, id(entry.member), id(entry.combined)) for entry in entries)
+    cached = getattr(self, '_flat_index', None)
+    if cached is not None and cached[0] == signature:
+      return cached[1]
+    self._flat_index = (signature, entries)
+    return entries
+  
+  def flat_index_signature(self):
+    """
+    Return a hashable signature of the bundle's membership and enabled states.
+    """
+    self.flat_index()
+    return self._flat_index[0]
+  
+  def enabled_members(self):
+    """
+    Return the items of this bundle (documents or nested bundles) that contain
+    at least one enabled document, in order.
+    """
+    members = []
+    for entry in self.flat_index():
+      if entry.enabled and (not members or members[-1] is not entry.member):
+        members.append(entry.member)
+    return members
   
+  @timed('as_flat_list')
   def as_flat_list(self, key='final'):
     """
-    Returns the nested bundle as a single flat list.
+    Returns the nested bundle as a single flat list of the files of each
+    enabled document, including addenda. An addendum object that several
+    documents share is only included once.
+    
+    If use_combined_addendum is True, the documents' own addenda are left out
+    and the bundle's combined_addendum is added at the end instead, when any
+    document overflows. A nested bundle with use_combined_addendum does the
+    same for its own documents, and its combined_addendum follows them.
     """
-    # Iterate through the list of self.templates
-    # If this is a simple document node, check if this individual template is enabled.
-    # Otherwise, call the bundle's as_list() method to show all enabled templates.
-    # Unpack the list of documents at each step so this can be concatenated into a single list
     flat_list = []
-    for document in self:
-      if isinstance(document, ALDocumentBundle):
-        flat_list.extend(document.as_list(key=key))
-      elif document.enabled: # base case
-        flat_list.extend(document.as_list(key=key))
-                         
+    if hasattr(self, 'use_combined_addendum') and self.use_combined_addendum:
+      for entry in self.flat_index():
+        if entry.enabled:
+          flat_list.append(entry.document[key])
+      if self.overflow_documents():
+        flat_list.append(self.combined_addendum)
+      return flat_list
+    seen_addenda = set()
+    entries = [entry for entry in self.flat_index() if entry.enabled]
+    for index, entry in enumerate(entries):
+      if entry.combined is not None:
+        flat_list.append(entry.document[key])
+        # The nested bundle's documents are listed together
+        if (index + 1 == len(entries) or entries[index + 1].combined is not entry.combined) and entry.combined.overflow_documents():
+          flat_list.append(entry.combined.combined_addendum)
+        continue
+      files = entry.document.as_list(key=key)
+      flat_list.append(files[0])
+      for addendum in files[1:]:
+        if id(addendum) not in seen_addenda:
+          seen_addenda.add(id(addendum))
+          flat_list.append(addendum)
     return flat_list
+  
+  @render_scope
+  def overflow_documents(self):
+    """
+    Return the enabled documents that have an addendum and overflowing fields,
+    in order. Useful to loop over in a combined_addendum template.
+    """
+    return [entry.document for entry in self.flat_index()
+            if entry.enabled and entry.document.has_addendum and entry.document.has_overflow()]
  
-  def as_pdf_list(self, key='final'):
+  @render_scope
+  def as_pdf_list(self, key='final', concurrent=False, max_workers=4):
     """
-    Returns the nested bundles as a list of PDFs that is only one level deep.
+    Returns the nested bundles as a list of PDFs that is only one level deep:
+    one PDF for each enabled document or nested bundle.
+    
+    If concurrent is True, the PDFs are concatenated in a pool of up to
+    max_workers threads. The list stays in bundle order. If any document
+    fails, each failure is logged and the first one (in bundle order) is raised.
     """
-    return [document.as_pdf(key=key) for document in self]
+    if not concurrent:
+      return [document.as_pdf(key=key) for document in self.enabled_members()]
+    # Overflow checks read the interview answers, so collect each member's
+    # files here and only hand the concatenation to the pool
+    jobs = []
+    for document in self.enabled_members():
+      if isinstance(document, ALDocumentBundle):
+        jobs.append((document, document.as_flat_list(key=key), document._stream_over_bytes()))
+      else:
+        jobs.append((document, document.as_list(key=key), None))
+    concatenate = in_thread_context(concatenate_cached)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+      futures = [executor.submit(concatenate, inputs, key=key, filename=pdf_filename(document.filename), stream_over_bytes=stream_over_bytes)
+                 for document, inputs, stream_over_bytes in jobs]
+    pdfs = []
+    first_error = None
+    for (document, inputs, stream_over_bytes), future in zip(jobs, futures):
+      try:
+        pdf = future.result()
+      except Exception as err:
+        log("Unable to assemble " + document.instanceName + ": " + str(err))
+        if first_error is None:
+          first_error = err
+        continue
+      pdf.title = document.title
+      pdfs.append(pdf)
+    if first_error is not None:
+      raise first_error
+    return pdfs
   
-  def as_pdf_list_table(self, key='final'):
+  @timed('as_zip')
+  @render_scope
+  def as_zip(self, key='final', filename=None):
     """
-    Returns string of a table to display a list
-    of pdfs with 'view' and 'download' buttons.
+    Return a ZIP archive with one PDF for each enabled document or nested
+    bundle, like as_pdf_list(). Each PDF is written into the archive as soon
+    as it is built (or found in the PDF cache), rather than building them all first.
     """
-    html ='<table class="al_table" id="' + html_safe_str(self.instanceName) + '">'
-    
-    for doc in self:
-      html += table_row( doc, key )
+    pdfs = (document.as_pdf(key=key) for document in self.enabled_members())
+    return zip_files(pdfs, filename=filename or os.path.splitext(pdf_filename(self.filename))[0] + '.zip')
+  
+  def cached_table(self, members, key='final', lazy=False, classes='al_table'):
+    """
+    Return the HTML of a download table with a row for each of members.
     
-    html += '\n</table>'
+    The table is kept in `table_cache`, keyed by a fingerprint of the session,
+    the members and their titles and filenames, and (unless lazy) the files each member's
+    PDF is built from. It is only rebuilt when one of those changes, so a
+    screen that is shown again doesn't call url_for() and action_button_html()
+    for every row.
+    """
+    fingerprint = [user_info().session, self.instanceName, classes, key, lazy, word("View"), word("Download")]
+    for member in members:
+      fingerprint.append((member.instanceName, member.title, member.filename))
+      if not lazy:
+        if isinstance(member, ALDocumentBundle):
+          fingerprint.append(file_fingerprint(member.as_flat_list(key=key)))
+        else:
+          fingerprint.append(file_fingerprint(member.as_list(key=key)))
+    if None in fingerprint:
+      cache_key = None
+    else:
+      cache_key = hashlib.sha1(repr(fingerprint).encode('utf-8')).hexdigest()
+    html = table_cache.get(cache_key)
+    if html is None:
+      rows = [table_row(member, key, lazy=lazy) for member in members]
+      html = ''.join(['<table class="', classes, '" id="', html_safe_str(self.instanceName), '">'] + rows + ['\n</table>'])
+      table_cache.put(cache_key, html)
+    return html
+  
+  @render_scope
+  def as_pdf_list_table(self, key='final', lazy=False):
+    """
+    Returns string of a table to display a list
+    of pdfs with 'view' and 'download' buttons.
     
+    If lazy is True, each PDF is only assembled when its button is first
+    clicked. Include al_document.yml in your interview to use this.
+    """
     # Discuss: Do we want a table with the ability to have a merged pdf row?
-    return html
+    return self.cached_table(self.enabled_members(), key=key, lazy=lazy)
   
-  def as_pdf_table(self, key='final'):
+  @render_scope
+  def as_pdf_table(self, key='final', lazy=False):
     """
     Returns a string of a table to display all the docs
     combined into one pdf with 'view' and 'download' buttons.
-    """
-    html ='<table class="al_table merged_docs" id="' + html_safe_str(self.instanceName) + '">'
-    html += table_row( self, key )
-    html += '\n</table>'
     
-    return html
+    See as_pdf_list_table() for the lazy option.
+    """
+    return self.cached_table([self], key=key, lazy=lazy, classes='al_table merged_docs')
+  
+  def timing_report(self, log_report=False):
+    """
+    Return the report of the timing being recorded on this thread, e.g.
+    inside a recording_timing() block, or None. Recording isn't stopped.
+    If log_report is True, also write it to the log as one JSON line so
+    slow screens can be traced to a form or field.
+    """
+    report = timing_report()
+    if log_report and report is not None:
+      log("ALDocument timing for " + self.instanceName + ": " + json.dumps(report))
+    return report
   
   def table_css(self):
     """
@@ -489,30 +1845,7 @@ class ALDocumentBundle(DAList):
     This will be hard to develop with and it will be a bit
     harder to override for developers using this module.
     """
-    return '''<style>\n
-    .al_table_css_sibling + div thead {
-      display: none;
-    }
-
-    .al_table_css_sibling + div td {
-      padding: .3em;
-      vertical-align: text-top;
-    }
-    td.text-left:first-child {
-      width: 1em;
-      padding-left: .5em;
-    }
-    .al_table_css_sibling + div td.text-left + td.text-right {
-      width: 5em;
-    }
-    .al_table_css_sibling + div td.text-right {
-      width: 7em;
-    }
-
-    .al_table_css_sibling + div a {
-      margin: 0em;
-    }
-  </style>'''
+    return TABLE_CSS
     
 class ALDocumentBundleDict(DADict):
   """
@@ -525,24 +1858,64 @@ class ALDocumentBundleDict(DADict):
   different scenarios.
   """
   def init(self, *pargs, **kwargs):
-    super(ALBundleList, self).init(*pargs, **kwargs)
+    super(ALDocumentBundleDict, self).init(*pargs, **kwargs)
     self.auto_gather=False
     self.gathered=True
-    self.object_type = ALBundle
+    self.object_type = ALDocumentBundle
     if not hasattr(self, 'gathered'):
       self.gathered = True
     if not hasattr(self, 'auto_gather'):
       self.auto_gather=False
 
-  def preview(format='PDF', bundle='user_bundle'):
+  def start_prerender(self, key='final', executor=None):
+    """
+    Start building the combined PDF of every enabled bundle in the background.
+    Returns a dictionary of bundle name -> status.
+    """
+    return {name: bundle.start_prerender(key=key, executor=executor) for name, bundle in self.items()
+            if not hasattr(bundle, 'enabled') or bundle.enabled}
+  
+  def prerender_status(self, key='final'):
+    """
+    Return a dictionary of bundle name -> 'ready', 'pending', 'failed' or 'not started'.
+    """
+    return {name: bundle.prerender_status(key=key) for name, bundle in self.items()
+            if not hasattr(bundle, 'enabled') or bundle.enabled}
+  
+  @render_scope
+  def as_pdfs(self, key='final'):
+    """
+    Return a dictionary of bundle name -> combined PDF. A document that is in
+    several bundles is only checked for overflow and assembled once.
+    """
+    return {name: bundle.as_pdf(key=key) for name, bundle in self.items()}
+  
+  @render_scope
+  def as_pdf_lists(self, key='final'):
+    """
+    Return a dictionary of bundle name -> as_pdf_list(). A document that is in
+    several bundles is only checked for overflow and assembled once.
+    """
+    return {name: bundle.as_pdf_list(key=key) for name, bundle in self.items()}
+  
+  @render_scope
+  def preview(self, format='PDF', bundle='user_bundle', max_pages=None, skip_images=False):
     """
     Create a copy of the document as a single PDF that is suitable for a preview version of the 
-    document (before signature is added).
+    document (before signature is added). See ALDocumentBundle.preview() for the other options.
+    """
+    return self[bundle].preview(max_pages=max_pages, skip_images=skip_images)
+  
+  @render_scope
+  def as_zip(self, bundle='court_bundle', key='final', filename=None):
+    """
+    Return the documents of one bundle as a ZIP archive, for a "download everything" link.
     """
-    return self[bundle].as_pdf(key='preview', format=format)
+    return self[bundle].as_zip(key=key, filename=filename)
   
-  def as_attachment(format='PDF', bundle='court_bundle'):
+  @render_scope
+  def as_attachment(self, format='PDF', bundle='court_bundle'):
     """
     Return a list of PDF-ified documents, suitable to make an attachment to send_mail.
     """
-    return self[bundle].as_pdf_list(key='final')
\ No newline at end of file
+    return self[bundle].as_pdf_list(key='final')
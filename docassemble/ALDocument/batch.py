@@ -0,0 +1,195 @@
+"""
+Regenerate filings in bulk from stored answer sets, e.g. after a form revision.
+
+Each JSON file in the answers directory holds the interview variables for one
+case. For each case a new session of the interview is started through the
+docassemble API, the answers are set, and the al_batch_assemble action (from
+al_document.yml, which the interview must include) assembles the requested
+bundles. Cases run in a pool of processes; a line with the result and timing of
+each case is written to the manifest as soon as it finishes.
+
+    python -m docassemble.ALDocument.batch --server https://da.example.com \\
+      --interview docassemble.MyForms:data/questions/motion.yml \\
+      --answers answers/ --bundle court_bundle --manifest manifest.jsonl
+
+The API key is read from --api-key or the DOCASSEMBLE_API_KEY environment variable.
+
+With --local module:function, no server is used: the bundles are assembled
+in the worker processes with the stand-in runtime in local_runtime.py. For
+each case the answers are defined as variables, function() is called to set
+up the bundles (it can define them itself, or return a dictionary of name ->
+bundle), and each bundle's PDF is written to the --download directory:
+
+    python -m docassemble.ALDocument.batch --local my_forms.batch:build \\
+      --answers answers/ --bundle court_bundle --download output/
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+class BatchError(Exception):
+  pass
+
+def api_request(options, method, endpoint, data=None, params=None):
+  """
+  Call the docassemble API and return the decoded JSON response, or None if
+  it had no content.
+  """
+  url = options['server'].rstrip('/') + endpoint
+  if params:
+    url += '?' + urllib.parse.urlencode(params)
+  body = None
+  headers = {'X-API-Key': options['api_key']}
+  if data is not None:
+    body = json.dumps(data).encode('utf-8')
+    headers['Content-Type'] = 'application/json'
+  request = urllib.request.Request(url, data=body, headers=headers, method=method)
+  try:
+    with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+      content = response.read()
+  except urllib.error.HTTPError as err:
+    raise BatchError(method + ' ' + endpoint + ' failed with ' + str(err.code) + ': ' + err.read().decode('utf-8', 'replace')[:500])
+  if not content:
+    return None
+  return json.loads(content.decode('utf-8'))
+
+def download(url, path, timeout):
+  with urllib.request.urlopen(url, timeout=timeout) as response, open(path, 'wb') as output:
+    while True:
+      block = response.read(1024 * 1024)
+      if not block:
+        break
+      output.write(block)
+
+def run_case(options, answers_path):
+  """
+  Assemble the bundles for one answer file. Returns a manifest entry; errors are
+  reported in the entry instead of raised, so one bad case doesn't stop the batch.
+  """
+  case = os.path.splitext(os.path.basename(answers_path))[0]
+  start = time.time()
+  entry = {'case': case, 'answers': answers_path}
+  try:
+    with open(answers_path) as answers_file:
+      variables = json.load(answers_file)
+    session = api_request(options, 'GET', '/api/session/new', params={'i': options['interview']})
+    entry['session'] = session['session']
+    state = {'i': options['interview'], 'session': session['session'], 'secret': session['secret']}
+    api_request(options, 'POST', '/api/session', data=dict(state, variables=variables))
+    files = api_request(options, 'POST', '/api/session/action', data=dict(state, action='al_batch_assemble',
+                        arguments={'bundles': options['bundles'], 'key': options['key']}))
+    if not files:
+      raise BatchError('al_batch_assemble returned nothing; does the interview include al_document.yml?')
+    entry['files'] = files
+    if options['download']:
+      case_dir = os.path.join(options['download'], case)
+      os.makedirs(case_dir, exist_ok=True)
+      for name, url in files.items():
+        download(url, os.path.join(case_dir, name + '.pdf'), options['timeout'])
+    entry['status'] = 'ok'
+  except Exception as err:
+    entry['status'] = 'error'
+    entry['error'] = str(err)
+  entry['seconds'] = time.time() - start
+  return entry
+
+def run_local_case(options, answers_path):
+  """
+  Like run_case(), but assemble the bundles in this process with the
+  stand-in runtime (see --local). entry['files'] maps each bundle to the path
+  of its PDF.
+  """
+  case = os.path.splitext(os.path.basename(answers_path))[0]
+  start = time.time()
+  entry = {'case': case, 'answers': answers_path}
+  try:
+    from docassemble.ALDocument import local_runtime
+    local_runtime.install(force=True)
+    local_runtime.reset()
+    with open(answers_path) as answers_file:
+      variables = json.load(answers_file)
+    for name, the_value in variables.items():
+      local_runtime.define(name, the_value)
+    module_name, function_name = options['local'].split(':')
+    bundles = getattr(importlib.import_module(module_name), function_name)()
+    for name, bundle in (bundles or {}).items():
+      local_runtime.define(name, bundle)
+    from docassemble.ALDocument.al_document import batch_document, document_key
+    key = document_key(options['key'])
+    case_dir = os.path.join(options['download'], case)
+    os.makedirs(case_dir, exist_ok=True)
+    files = {}
+    for name in options['bundles']:
+      path = os.path.join(case_dir, name + '.pdf')
+      shutil.copyfile(batch_document(name).as_pdf(key=key).path(), path)
+      files[name] = path
+    entry['files'] = files
+    entry['status'] = 'ok'
+  except Exception as err:
+    entry['status'] = 'error'
+    entry['error'] = str(err)
+  entry['seconds'] = time.time() - start
+  return entry
+
+def run_batch(options, answers_paths, manifest):
+  """
+  Run every case in a process pool and write one JSON line per case to the
+  open manifest file as each one finishes. Returns a summary dictionary.
+  """
+  start = time.time()
+  counts = {'ok': 0, 'error': 0}
+  with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+    run = run_local_case if options.get('local') else run_case
+    futures = [executor.submit(run, options, path) for path in answers_paths]
+    for future in as_completed(futures):
+      entry = future.result()
+      counts[entry['status']] += 1
+      manifest.write(json.dumps(entry) + '\n')
+      manifest.flush()
+  elapsed = time.time() - start
+  return {'cases': len(answers_paths), 'ok': counts['ok'], 'errors': counts['error'], 'seconds': elapsed,
+          'cases_per_minute': len(answers_paths) / elapsed * 60 if elapsed else None}
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Assemble ALDocument bundles for a directory of JSON answer files.')
+  parser.add_argument('--server', help='URL of the docassemble server')
+  parser.add_argument('--api-key', default=os.environ.get('DOCASSEMBLE_API_KEY'))
+  parser.add_argument('--interview', help='e.g. docassemble.MyForms:data/questions/motion.yml')
+  parser.add_argument('--local', help='module:function that sets up the bundles, to assemble them without a server')
+  parser.add_argument('--answers', required=True, help='directory of JSON answer files, one per case')
+  parser.add_argument('--bundle', action='append', dest='bundles', help='bundle to assemble (repeatable); default court_bundle')
+  parser.add_argument('--key', default='final', help="'final' or 'preview'")
+  parser.add_argument('--workers', type=int, default=4)
+  parser.add_argument('--manifest', default='manifest.jsonl')
+  parser.add_argument('--download', help='directory to save the PDFs in, one folder per case')
+  parser.add_argument('--timeout', type=int, default=300, help='seconds to wait for each API call')
+  args = parser.parse_args(argv)
+  if args.local:
+    if ':' not in args.local:
+      parser.error('--local needs a module:function')
+    if not args.download:
+      parser.error('--local needs a --download directory for the PDFs')
+  else:
+    if not args.server or not args.interview:
+      parser.error('--server and --interview are needed, unless --local is used')
+    if not args.api_key:
+      parser.error('an API key is needed: use --api-key or set DOCASSEMBLE_API_KEY')
+  options = {'server': args.server, 'api_key': args.api_key, 'interview': args.interview, 'local': args.local,
+             'bundles': args.bundles or ['court_bundle'], 'key': args.key, 'workers': args.workers,
+             'download': args.download, 'timeout': args.timeout}
+  answers_paths = sorted(os.path.join(args.answers, name) for name in os.listdir(args.answers) if name.endswith('.json'))
+  with open(args.manifest, 'w') as manifest:
+    summary = run_batch(options, answers_paths, manifest)
+  print(json.dumps(summary))
+  return 0 if summary['errors'] == 0 else 1
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Times the hot paths of al_document.py on synthetic data. Run it in a
+development interview (aldoc_benchmark.yml), or locally with the stand-in
+runtime from local_runtime.py:
+
+    python -m docassemble.ALDocument.benchmark --baseline tests/benchmark_baseline.json
+
+Save the results with --output to update the baseline.
+"""
+if __name__ == '__main__':
+  from docassemble.ALDocument.local_runtime import install
+  install()
+from docassemble.base.util import DAObject, DAFile, define, undefine, value
+from docassemble.ALDocument.al_document import ALDocument, ALDocumentBundle, ALAddendumField, ALAddendumFieldDict, fit_text, pdf_cache, table_cache
+import argparse
+import json
+import os
+import pickle
+import time
+
+# Number of items used by each case at each size
+SIZES = {
+  'realistic': {
+    'text_length': 2000,
+    'rows': 100,
+    'docx_rows': 100,
+    'fields': 20,
+    'nesting': 3,
+    'documents': 10,
+  },
+  'extreme': {
+    'text_length': 20000,
+    'rows': 100000,
+    'docx_rows': 20000,
+    'fields': 500,
+    'nesting': 200,
+    'documents': 200,
+  },
+}
+
+def time_it(func, setup=None, repeat=5):
+  """
+  Return the fastest of `repeat` runs of func(), in seconds. setup() runs
+  untimed before each run, e.g. to clear caches.
+  """
+  best = None
+  for _ in range(repeat):
+    if setup:
+      setup()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+def clear_caches(fields=None):
+  """
+  Clear the module caches and each field's saved overflow state so every
+  run measures a cold evaluation.
+  """
+  fit_text.cache_clear()
+  pdf_cache.clear()
+  table_cache.clear()
+  for field in (fields or []):
+    for state in ('_overflow_state', '_docx_state'):
+      if hasattr(field, state):
+        delattr(field, state)
+
+def make_text(length):
+  paragraph = ("The quick brown fox jumps over the lazy dog. " * 12).strip()
+  paragraphs = []
+  total = 0
+  while total < length:
+    paragraphs.append(paragraph)
+    total += len(paragraph) + 2
+  return "\n\n".join(paragraphs)[:length]
+
+def make_field(name, field_name, overflow_trigger):
+  field = ALAddendumField(name)
+  field.field_name = field_name
+  field.overflow_trigger = overflow_trigger
+  return field
+
+def make_document(name, page, **kwargs):
+  """
+  Return an enabled ALDocument without an addendum that uses the assembled
+  file page as its final and preview attachment. Its title and filename are
+  name, unless given in kwargs. Also used by the tests.
+  """
+  options = dict(title=name, filename=name, enabled=True, has_addendum=False)
+  options.update(kwargs)
+  document = ALDocument(name, **options)
+  document['final'] = page
+  document['preview'] = page
+  document.overflow_fields.gathered = True
+  return document
+
+def make_bundle(name, elements, **kwargs):
+  """
+  Return an ALDocumentBundle of elements, titled and named name unless given in kwargs.
+  """
+  options = dict(title=name, filename=name)
+  options.update(kwargs)
+  return ALDocumentBundle(name, elements=elements, **options)
+
+def make_nested_bundle(name, depth, page):
+  """
+  Return a bundle nested `depth` levels deep, with one document at each level.
+  """
+  bundle = make_bundle(name, [make_document(name + '_doc', page)])
+  for level in range(depth):
+    bundle = make_bundle(name + '_' + str(level), [make_document(name + '_doc' + str(level), page), bundle], title=name, filename=name)
+  return bundle
+
+def run_benchmarks(page, sizes=('realistic', 'extreme'), repeat=5):
+  """
+  Time the hot paths of al_document.py on synthetic data and return a list of
+  dictionaries with the case, size, number of items and best time in seconds.
+
+  page is a small assembled attachment that stands in for every document.
+  Must be called from inside an interview, or with the stand-in runtime
+  installed, because the fields are read with defined()/value().
+  """
+  results = []
+  defined_names = []
+  def define_variable(name, the_value):
+    define(name, the_value)
+    defined_names.append(name)
+  def record(case, size, items, func, setup=None, runs=repeat, size_in_bytes=None):
+    try:
+      seconds = time_it(func, setup=setup, repeat=runs)
+      error = None
+    except Exception as err:
+      seconds = None
+      error = str(err)
+    results.append({'case': case, 'size': size, 'items': items, 'seconds': seconds, 'bytes': size_in_bytes, 'error': error})
+
+  for size in sizes:
+    config = SIZES[size]
+
+    define_variable('al_bench_text', make_text(config['text_length']))
+    text_field = make_field('al_bench_text_field', 'al_bench_text', 600)
+    record('safe_value', size, config['text_length'],
+           lambda: text_field.safe_value(overflow_message=' (see addendum)', preserve_newlines=True),
+           setup=lambda: clear_caches([text_field]))
+    record('overflow_value', size, config['text_length'],
+           lambda: text_field.overflow_value(overflow_message=' (see addendum)'),
+           setup=lambda: clear_caches([text_field]))
+
+    define_variable('al_bench_rows', [DAObject('al_bench_rows[' + str(index) + ']', name='Item ' + str(index), amount=index) for index in range(config['rows'])])
+    rows_field = make_field('al_bench_rows_field', 'al_bench_rows', 2)
+    record('overflow_markdown', size, config['rows'], rows_field.overflow_markdown, setup=clear_caches, runs=min(repeat, 3))
+
+    define_variable('al_bench_docx_rows', value('al_bench_rows')[:config['docx_rows']])
+    docx_field = make_field('al_bench_docx_field', 'al_bench_docx_rows', 0)
+    record('overflow_docx_file', size, config['docx_rows'], docx_field.overflow_docx_file, setup=lambda: clear_caches([docx_field]), runs=1)
+
+    fields = ALAddendumFieldDict('al_bench_fields')
+    for index in range(config['fields']):
+      field_name = 'al_bench_field_' + str(index)
+      define_variable(field_name, make_text(100 + index % 500))
+      fields.initializeObject(field_name)
+      fields[field_name].overflow_trigger = 300
+    fields.gathered = True
+    record('defined_fields', size, config['fields'], fields.defined_fields,
+           setup=lambda: clear_caches(fields.values()))
+
+    # Docassemble pickles the interview state on every step
+    document = make_document('al_bench_pickled', page)
+    for field_name in fields.keys():
+      document.overflow_fields.initializeObject(field_name)
+      document.overflow_fields[field_name].overflow_trigger = 300
+    # The size before any field is evaluated, to show what evaluating adds
+    record('pickle ALDocument (unevaluated)', size, config['fields'], lambda: pickle.dumps(document), size_in_bytes=len(pickle.dumps(document)))
+    document.has_overflow()
+    pickled = pickle.dumps(document)
+    record('pickle ALDocument', size, config['fields'], lambda: pickle.dumps(document), size_in_bytes=len(pickled))
+    record('unpickle ALDocument', size, config['fields'], lambda: pickle.loads(pickled), size_in_bytes=len(pickled))
+
+    nested = make_nested_bundle('al_bench_nested', config['nesting'], page)
+    record('as_flat_list (nested)', size, config['nesting'], nested.as_flat_list)
+
+    bundle = make_bundle('al_bench_bundle', [make_document('al_bench_doc_' + str(index), page) for index in range(config['documents'])],
+                         title='Bundle', filename='bundle')
+    record('as_pdf_list_table (lazy)', size, config['documents'], lambda: bundle.as_pdf_list_table(lazy=True), setup=clear_caches)
+    record('as_pdf_list_table (lazy, cached)', size, config['documents'], lambda: bundle.as_pdf_list_table(lazy=True))
+    if size == 'realistic':
+      # Assembling every PDF at the extreme size takes minutes
+      record('as_pdf_list_table', size, config['documents'], bundle.as_pdf_list_table, setup=clear_caches, runs=1)
+    # Builds any PDFs that aren't cached yet while it streams them into the archive
+    archives = []
+    record('as_zip', size, config['documents'], lambda: archives.append(bundle.as_zip()), runs=1)
+    if archives:
+      results[-1]['bytes'] = os.path.getsize(archives[-1].path())
+
+  # Don't leave the synthetic answers in the interview state
+  undefine(*set(defined_names))
+  return results
+
+def save_results(results, filename='al_benchmarks.json'):
+  """
+  Save the results as a JSON DAFile that can be downloaded and kept as a baseline.
+  """
+  the_file = DAFile()
+  the_file.initialize(filename=filename)
+  the_file.write(json.dumps(results, indent=2))
+  the_file.commit()
+  return the_file
+
+def compare_to_baseline(results, baseline):
+  """
+  Add a 'baseline' and 'ratio' (new time / baseline time), and the baseline's
+  'baseline_bytes', to each result that has a matching case and size in the baseline list.
+  """
+  previous = {(item['case'], item['size']): item for item in baseline}
+  for result in results:
+    item = previous.get((result['case'], result['size']), {})
+    baseline_seconds = item.get('seconds')
+    result['baseline'] = baseline_seconds
+    result['baseline_bytes'] = item.get('bytes')
+    if baseline_seconds and result['seconds'] is not None:
+      result['ratio'] = result['seconds'] / baseline_seconds
+    else:
+      result['ratio'] = None
+  return results
+
+def main(argv=None):
+  from docassemble.ALDocument.local_runtime import blank_pdf
+  parser = argparse.ArgumentParser(description='Time the hot paths of al_document.py with the stand-in runtime.')
+  parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['realistic', 'extreme'])
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+  parser.add_argument('--output', help='save the results as JSON, e.g. to update the baseline')
+  args = parser.parse_args(argv)
+  results = run_benchmarks(blank_pdf(), sizes=args.sizes, repeat=args.repeat)
+  if args.baseline:
+    with open(args.baseline) as baseline:
+      compare_to_baseline(results, json.load(baseline))
+  for result in results:
+    line = '%-32s %-10s %8s  ' % (result['case'], result['size'], result['items'])
+    if result['seconds'] is None:
+      line += 'error: ' + result['error']
+    else:
+      line += '%.5fs' % result['seconds']
+      if result.get('ratio'):
+        line += ' (%.2fx baseline)' % result['ratio']
+    if result.get('bytes'):
+      line += '  %d bytes' % result['bytes']
+    print(line)
+  if args.output:
+    with open(args.output, 'w') as output:
+      json.dump(results, output, indent=2)
+  return 1 if any(result['error'] for result in results) else 0
+
+if __name__ == '__main__':
+  raise SystemExit(main())
@@ -0,0 +1,328 @@
+"""
+A small stand-in for docassemble.base.util, so this package can run outside
+a docassemble server: for the tests, the benchmarks
+(python -m docassemble.ALDocument.benchmark) and batch.py --local.
+
+It only covers what this package uses. Interview answers live in the
+`answers` dictionary (see define()), files are kept in a temporary directory,
+and pdf_concatenate() merges PDFs with PyPDF2.
+
+Call install() before importing al_document.
+"""
+from collections import OrderedDict
+import importlib.util
+import itertools
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import types
+import urllib.parse
+
+answers = {}
+
+_file_numbers = itertools.count(1)
+_files_dir = None
+
+def install(force=False):
+  """
+  Make `docassemble.base.util` and `docassemble.base.functions` refer to this
+  stand-in. Unless force is True, nothing is done when docassemble itself is
+  installed. Returns True if the stand-in is in use.
+  """
+  if not force:
+    try:
+      import docassemble.base.util
+      return docassemble.base.util is sys.modules[__name__]
+    except ImportError:
+      pass
+  import docassemble
+  base = types.ModuleType('docassemble.base')
+  base.__path__ = []
+  functions = types.ModuleType('docassemble.base.functions')
+  functions.this_thread = this_thread
+  base.util = sys.modules[__name__]
+  base.functions = functions
+  docassemble.base = base
+  sys.modules['docassemble.base'] = base
+  sys.modules['docassemble.base.util'] = base.util
+  sys.modules['docassemble.base.functions'] = functions
+  return True
+
+this_thread = threading.local()
+
+def reset():
+  """
+  Forget all answers, e.g. between tests or batch cases.
+  """
+  answers.clear()
+
+def _is_name(name):
+  return name.isidentifier()
+
+def define(name, the_value):
+  if _is_name(name):
+    answers[name] = the_value
+  else:
+    exec(name + ' = _al_value', {'_al_value': the_value}, answers)
+
+def undefine(*names):
+  for name in names:
+    try:
+      if _is_name(name):
+        del answers[name]
+      else:
+        exec('del ' + name, {}, answers)
+    except (KeyError, NameError, AttributeError, IndexError):
+      pass
+
+def value(name):
+  return eval(name, {}, answers)
+
+def defined(name):
+  try:
+    eval(name, {}, answers)
+  except (NameError, AttributeError, KeyError, IndexError):
+    return False
+  return True
+
+def word(text, **kwargs):
+  return text
+
+def log(message, priority='log'):
+  logging.getLogger('docassemble').info(message)
+
+class _UserInfo(object):
+  session = 'local'
+  filename = 'local'
+  language = 'en'
+
+def user_info():
+  return _UserInfo()
+
+def action_button_html(url, icon=None, color='primary', size='sm', block=False, label='Edit', classname=None, new_window=None, id_tag=None):
+  icon_html = '<i class="fas fa-' + icon + '"></i> ' if icon else ''
+  return '<a href="' + url + '" class="btn btn-' + size + ' btn-' + color + ' btn-darevisit">' + icon_html + label + '</a> '
+
+def include_docx_template(template_file, **kwargs):
+  if hasattr(template_file, 'path'):
+    template_file = template_file.path()
+  return '[include_docx_template ' + str(template_file) + ']'
+
+def path_and_mimetype(file_ref):
+  """
+  Return the path and MIME type of a "docassemble.Package:data/sources/file" reference.
+  """
+  package, relative_path = file_ref.split(':', 1)
+  spec = importlib.util.find_spec(package)
+  path = os.path.join(os.path.dirname(spec.origin), relative_path)
+  return path, mimetypes.guess_type(path)[0]
+
+class DAObject(object):
+  def __init__(self, *pargs, **kwargs):
+    if pargs:
+      self.instanceName = pargs[0]
+      self.has_nonrandom_instance_name = True
+      pargs = pargs[1:]
+    else:
+      self.instanceName = 'anonymous_' + str(id(self))
+      self.has_nonrandom_instance_name = False
+    self.attrList = []
+    self.init(*pargs, **kwargs)
+
+  def init(self, *pargs, **kwargs):
+    for name, the_value in kwargs.items():
+      setattr(self, name, the_value)
+
+  def initializeAttribute(self, name, objectType, **kwargs):
+    if name not in self.__dict__:
+      setattr(self, name, objectType(self.instanceName + '.' + name, **kwargs))
+    return getattr(self, name)
+
+  def url_action(self, action, **kwargs):
+    data = json.dumps({'action': self.instanceName + '.' + action, 'arguments': kwargs}, sort_keys=True)
+    return '?action=' + urllib.parse.quote(data)
+
+class DAList(DAObject):
+  def init(self, *pargs, **kwargs):
+    self.elements = list(kwargs.pop('elements', []))
+    self.gathered = False
+    self.auto_gather = True
+    super(DAList, self).init(*pargs, **kwargs)
+
+  def append(self, *items):
+    self.elements.extend(items)
+
+  def __iter__(self):
+    return iter(self.elements)
+
+  def __len__(self):
+    return len(self.elements)
+
+  def __getitem__(self, index):
+    return self.elements[index]
+
+  def __setitem__(self, index, the_value):
+    self.elements[index] = the_value
+
+  def __delitem__(self, index):
+    del self.elements[index]
+
+  def __contains__(self, item):
+    return item in self.elements
+
+class DADict(DAObject):
+  def init(self, *pargs, **kwargs):
+    self.elements = dict()
+    self.object_type = None
+    self.gathered = False
+    self.auto_gather = True
+    super(DADict, self).init(*pargs, **kwargs)
+
+  def initializeObject(self, *pargs, **kwargs):
+    entry = pargs[0]
+    objectType = pargs[1] if len(pargs) > 1 else self.object_type
+    self.elements[entry] = objectType(self.instanceName + '[' + repr(entry) + ']', **kwargs)
+    return self.elements[entry]
+
+  def __getitem__(self, entry):
+    if entry not in self.elements and self.object_type is not None:
+      return self.initializeObject(entry)
+    return self.elements[entry]
+
+  def __setitem__(self, entry, the_value):
+    self.elements[entry] = the_value
+
+  def __delitem__(self, entry):
+    del self.elements[entry]
+
+  def __contains__(self, entry):
+    return entry in self.elements
+
+  def __iter__(self):
+    return iter(self.elements)
+
+  def __len__(self):
+    return len(self.elements)
+
+  def keys(self):
+    return self.elements.keys()
+
+  def values(self):
+    return self.elements.values()
+
+  def items(self):
+    return self.elements.items()
+
+  def get(self, entry, default=None):
+    return self.elements.get(entry, default)
+
+  def pop(self, *pargs):
+    return self.elements.pop(*pargs)
+
+class DAOrderedDict(DADict):
+  def init(self, *pargs, **kwargs):
+    super(DAOrderedDict, self).init(*pargs, **kwargs)
+    self.elements = OrderedDict(self.elements)
+
+def _new_path(filename):
+  global _files_dir
+  if _files_dir is None:
+    _files_dir = tempfile.mkdtemp(prefix='al_local_files_')
+  directory = os.path.join(_files_dir, str(next(_file_numbers)))
+  os.makedirs(directory)
+  return os.path.join(directory, filename)
+
+class DAFile(DAObject):
+  def initialize(self, filename=None, extension=None, **kwargs):
+    if filename is None:
+      filename = 'file.' + (extension or 'txt')
+    self.filename = filename
+    self.extension = os.path.splitext(filename)[1].lstrip('.')
+    self.mimetype = mimetypes.guess_type(filename)[0]
+    self.file_path = _new_path(filename)
+    self.number = int(os.path.basename(os.path.dirname(self.file_path)))
+    self.ok = True
+    open(self.file_path, 'wb').close()
+
+  def path(self):
+    return self.file_path
+
+  def commit(self):
+    pass
+
+  def url_for(self, attachment=False, **kwargs):
+    url = '/uploadedfile/' + str(self.number) + '/' + urllib.parse.quote(self.filename)
+    if attachment:
+      url += '?attachment=1'
+    return url
+
+  def copy_into(self, other):
+    shutil.copyfile(other.path() if hasattr(other, 'path') else other, self.path())
+
+  def write(self, content, binary=False):
+    with open(self.path(), 'wb' if binary else 'w') as the_file:
+      the_file.write(content)
+
+  def page_path(self, page, prefix):
+    raise NotImplementedError('page images need a docassemble server')
+
+class DAFileCollection(DAObject):
+  pass
+
+class DAFileList(DAList):
+  pass
+
+def _input_paths(items):
+  for item in items:
+    if isinstance(item, DAFileList) or isinstance(item, (list, tuple)):
+      for path in _input_paths(item):
+        yield path
+    elif isinstance(item, DAFileCollection):
+      yield item.pdf.path()
+    elif isinstance(item, DAFile):
+      yield item.path()
+    else:
+      yield str(item)
+
+def pdf_concatenate(*pargs, **kwargs):
+  """
+  Merge the PDFs into a new DAFile with PyPDF2.
+  """
+  try:
+    from PyPDF2 import PdfReader, PdfWriter
+  except ImportError:
+    from PyPDF2 import PdfFileReader as PdfReader, PdfFileWriter as PdfWriter
+  writer = PdfWriter()
+  add_page = getattr(writer, 'add_page', None) or writer.addPage
+  for path in _input_paths(pargs):
+    for page in PdfReader(path).pages:
+      add_page(page)
+  pdf = DAFile()
+  pdf.initialize(filename=kwargs.get('filename', 'file.pdf'))
+  with open(pdf.path(), 'wb') as pdf_file:
+    writer.write(pdf_file)
+  return pdf
+
+def blank_pdf(filename='page.pdf', pages=1):
+  """
+  Return a DAFile with a PDF of blank letter-size pages, to stand in for an
+  assembled attachment.
+  """
+  try:
+    from PyPDF2 import PdfWriter
+  except ImportError:
+    from PyPDF2 import PdfFileWriter as PdfWriter
+  writer = PdfWriter()
+  add_blank_page = getattr(writer, 'add_blank_page', None) or writer.addBlankPage
+  for _ in range(pages):
+    add_blank_page(612, 792)
+  pdf = DAFile()
+  pdf.initialize(filename=filename)
+  with open(pdf.path(), 'wb') as pdf_file:
+    writer.write(pdf_file)
+  return pdf
@@ -0,0 +1,157 @@
+"""
+Merge PDFs into one file on disk, one object at a time, so memory use stays
+about the size of the largest single page's content however large the bundle.
+
+Each object of an input is written to the output as soon as it is read, and
+dropped from the reader's cache once it is written. Like pdf_concatenate(),
+only the pages are kept: bookmarks and the inputs' form field dictionaries
+(but not the fields' appearance) are left out. Needs pypdf or PyPDF2 3.
+"""
+
+try:
+  from pypdf import PdfReader
+  from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, StreamObject
+except ImportError:
+  from PyPDF2 import PdfReader
+  from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, StreamObject
+
+# Object numbers of the document catalog and page tree root in the output
+CATALOG = 1
+PAGES = 2
+
+# Written in place of each image when images are skipped
+BLANK_IMAGE = b'<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray /BitsPerComponent 8 /Length 1 >>\nstream\n\xff\nendstream'
+
+class StreamingPDFWriter(object):
+  """
+  Write a PDF to path by appending the pages of other PDFs with add_pdf(),
+  then close(). Can be used as a context manager.
+  """
+  def __init__(self, path):
+    self._file = open(path, 'wb')
+    self._file.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+    self._offsets = {}
+    self._next_number = PAGES + 1
+    self._kids = []
+    self.page_count = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    if exc_info[0] is None:
+      self.close()
+    else:
+      self._file.close()
+
+  def _number(self):
+    number = self._next_number
+    self._next_number += 1
+    return number
+
+  def add_pdf(self, path, max_pages=None, skip_images=False):
+    """
+    Append the pages of the PDF at path (at most max_pages of them). If
+    skip_images is True, each image is replaced with a blank 1x1 image.
+    Returns the number of pages added.
+    """
+    with open(path, 'rb') as input_file:
+      reader = PdfReader(input_file)
+      if reader.is_encrypted:
+        reader.decrypt('')
+      pages = list(reader.pages)
+      all_pages = set(page.indirect_reference.idnum for page in pages)
+      if max_pages is not None:
+        pages = pages[:max_pages]
+      numbers = {}
+      for page in pages:
+        numbers[page.indirect_reference.idnum] = self._number()
+      queue = []
+      def remap(obj):
+        if isinstance(obj, IndirectObject):
+          if obj.idnum not in numbers:
+            if obj.idnum in all_pages:
+              # A link to a page that was left out
+              return NullObject()
+            numbers[obj.idnum] = self._number()
+            queue.append(obj)
+          return IndirectObject(numbers[obj.idnum], 0, None)
+        if isinstance(obj, StreamObject):
+          return obj
+        if isinstance(obj, DictionaryObject):
+          copy = DictionaryObject()
+          for name, item in obj.items():
+            copy[NameObject(name)] = remap(item)
+          return copy
+        if isinstance(obj, ArrayObject):
+          return ArrayObject(remap(item) for item in obj)
+        return obj
+      for page in pages:
+        page_copy = DictionaryObject()
+        for name, item in page.items():
+          if name != '/Parent':
+            page_copy[NameObject(name)] = remap(item)
+        page_copy[NameObject('/Parent')] = IndirectObject(PAGES, 0, None)
+        number = numbers[page.indirect_reference.idnum]
+        self._write_object(number, page_copy)
+        self._kids.append(number)
+        self.page_count += 1
+        while queue:
+          reference = queue.pop()
+          obj = reference.get_object()
+          if skip_images and isinstance(obj, StreamObject) and obj.get('/Subtype') == '/Image':
+            self._write_raw(numbers[reference.idnum], BLANK_IMAGE)
+          elif isinstance(obj, StreamObject):
+            # The stream's data is written as it is; only its dictionary
+            # needs new object numbers
+            for name in list(obj.keys()):
+              obj[name] = remap(obj[name])
+            self._write_object(numbers[reference.idnum], obj)
+          else:
+            self._write_object(numbers[reference.idnum], NullObject() if obj is None else remap(obj))
+          reader.resolved_objects.pop((reference.generation, reference.idnum), None)
+    return len(pages)
+
+  def _write_object(self, number, obj):
+    self._offsets[number] = self._file.tell()
+    self._file.write(b'%d 0 obj\n' % number)
+    obj.write_to_stream(self._file, None)
+    self._file.write(b'\nendobj\n')
+
+  def _write_raw(self, number, data):
+    self._offsets[number] = self._file.tell()
+    self._file.write(b'%d 0 obj\n' % number + data + b'\nendobj\n')
+
+  def close(self):
+    """
+    Write the page tree, catalog and cross-reference table, and close the file.
+    """
+    self._offsets[PAGES] = self._file.tell()
+    self._file.write(b'%d 0 obj\n<< /Type /Pages /Count %d /Kids [' % (PAGES, len(self._kids)))
+    self._file.write(b' '.join(b'%d 0 R' % kid for kid in self._kids))
+    self._file.write(b'] >>\nendobj\n')
+    self._offsets[CATALOG] = self._file.tell()
+    self._file.write(b'%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n' % (CATALOG, PAGES))
+    xref = self._file.tell()
+    size = self._next_number
+    self._file.write(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+    for number in range(1, size):
+      self._file.write(b'%010d 00000 n \n' % self._offsets[number])
+    self._file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, CATALOG, xref))
+    self._file.close()
+
+def is_pdf(path):
+  with open(path, 'rb') as the_file:
+    return the_file.read(5) == b'%PDF-'
+
+def concatenate_paths(paths, output_path, max_pages=None, skip_images=False):
+  """
+  Merge the PDFs at paths into output_path, keeping at most max_pages pages.
+  Returns the number of pages written.
+  """
+  with StreamingPDFWriter(output_path) as writer:
+    for path in paths:
+      if max_pages is not None and writer.page_count >= max_pages:
+        break
+      writer.add_pdf(path, max_pages=None if max_pages is None else max_pages - writer.page_count, skip_images=skip_images)
+  return writer.page_count
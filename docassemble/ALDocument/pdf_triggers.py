@@ -0,0 +1,154 @@
+"""
+Estimate overflow triggers for the fields of a fillable PDF from their
+size, font and font size, so they don't have to be tuned by hand.
+
+Parsing a PDF is slow, so results are cached per template file hash and
+ESTIMATOR_VERSION, in memory and on disk. Warm the cache when you deploy with:
+
+    python -m docassemble.ALDocument.pdf_triggers path/to/template.pdf
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+
+# Part of the cache key: change it whenever the estimate below or the
+# fields' format changes, so results cached by an older version aren't used
+ESTIMATOR_VERSION = 1
+
+# Used when a field's font size is 0 (auto) or missing
+DEFAULT_FONT_SIZE = 10
+# Average character width as a fraction of the font size
+DEFAULT_CHAR_WIDTH = 0.5
+MONOSPACE_CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.2
+# Space between the field's border and its text, in points
+PADDING = 2
+# Field flag for multiline text fields
+MULTILINE_FLAG = 1 << 12
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'al_overflow_triggers')
+
+_memory_cache = {}
+
+def file_hash(path):
+  digest = hashlib.sha256()
+  with open(path, 'rb') as the_file:
+    for block in iter(lambda: the_file.read(1024 * 1024), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+def field_capacity(rect, font_size=DEFAULT_FONT_SIZE, multiline=False, font_name='', max_length=None):
+  """
+  Return (overflow_trigger, input_width, lines) for a text field with the given
+  rectangle [x1, y1, x2, y2] in points.
+  """
+  if not font_size:
+    font_size = DEFAULT_FONT_SIZE
+  if 'cour' in font_name.lower():
+    char_width = font_size * MONOSPACE_CHAR_WIDTH
+  else:
+    char_width = font_size * DEFAULT_CHAR_WIDTH
+  width = abs(float(rect[2]) - float(rect[0])) - 2 * PADDING
+  height = abs(float(rect[3]) - float(rect[1])) - 2 * PADDING
+  input_width = max(int(width / char_width), 1)
+  if multiline:
+    lines = max(int(height / (font_size * LINE_HEIGHT)), 1)
+  else:
+    lines = 1
+  if max_length:
+    return int(max_length), input_width, lines
+  return input_width * lines, input_width, lines
+
+def _resolve(obj):
+  if hasattr(obj, 'get_object'):
+    return obj.get_object()
+  if hasattr(obj, 'getObject'):
+    return obj.getObject()
+  return obj
+
+def _inherited(annotation, key):
+  """
+  Look up a field attribute on the widget or any of its parent fields.
+  """
+  node = annotation
+  while node is not None:
+    if key in node:
+      return _resolve(node[key])
+    node = _resolve(node['/Parent']) if '/Parent' in node else None
+  return None
+
+def _full_name(annotation):
+  names = []
+  node = annotation
+  while node is not None:
+    if '/T' in node:
+      names.append(str(_resolve(node['/T'])))
+    node = _resolve(node['/Parent']) if '/Parent' in node else None
+  return '.'.join(reversed(names))
+
+def read_pdf_fields(path):
+  """
+  Return a list of dictionaries with the name and estimated capacity of each
+  text field in the PDF at path. Needs PyPDF2.
+  """
+  try:
+    from PyPDF2 import PdfReader
+  except ImportError:
+    from PyPDF2 import PdfFileReader as PdfReader
+  reader = PdfReader(path)
+  root = _resolve(reader.trailer['/Root'])
+  acroform = _resolve(root['/AcroForm']) if '/AcroForm' in root else {}
+  default_appearance = str(_resolve(acroform['/DA'])) if '/DA' in acroform else ''
+  fields = []
+  seen = set()
+  for page in reader.pages:
+    for annotation in _resolve(page.get('/Annots')) or []:
+      annotation = _resolve(annotation)
+      if annotation.get('/Subtype') != '/Widget' or _inherited(annotation, '/FT') != '/Tx':
+        continue
+      name = _full_name(annotation)
+      if not name or name in seen:
+        continue
+      seen.add(name)
+      appearance = _inherited(annotation, '/DA')
+      match = re.search(r'/([^\s/]+)\s+([\d.]+)\s+Tf', str(appearance) if appearance is not None else default_appearance)
+      font_name = match.group(1) if match else ''
+      font_size = float(match.group(2)) if match else DEFAULT_FONT_SIZE
+      flags = int(_inherited(annotation, '/Ff') or 0)
+      max_length = _inherited(annotation, '/MaxLen')
+      overflow_trigger, input_width, lines = field_capacity(
+        [float(number) for number in annotation['/Rect']], font_size=font_size,
+        multiline=bool(flags & MULTILINE_FLAG), font_name=font_name, max_length=max_length)
+      fields.append({'field_name': name, 'overflow_trigger': overflow_trigger,
+                     'input_width': input_width, 'lines': lines, 'font_size': font_size or DEFAULT_FONT_SIZE})
+  return fields
+
+def pdf_overflow_triggers(path):
+  """
+  Return read_pdf_fields(path), parsing each distinct template file only once
+  per deploy: results are cached by the file's hash and ESTIMATOR_VERSION, in
+  memory and in CACHE_DIR.
+  """
+  cache_name = file_hash(path) + '-v' + str(ESTIMATOR_VERSION)
+  if cache_name in _memory_cache:
+    return _memory_cache[cache_name]
+  cache_path = os.path.join(CACHE_DIR, cache_name + '.json')
+  try:
+    with open(cache_path) as cache_file:
+      fields = json.load(cache_file)
+  except (OSError, ValueError):
+    fields = read_pdf_fields(path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_path = cache_path + '.' + str(os.getpid())
+    with open(temp_path, 'w') as cache_file:
+      json.dump(fields, cache_file)
+    os.replace(temp_path, cache_path)
+  _memory_cache[cache_name] = fields
+  return fields
+
+if __name__ == '__main__':
+  for template in sys.argv[1:]:
+    print(json.dumps({template: pdf_overflow_triggers(template)}, indent=2))
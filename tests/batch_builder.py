@@ -0,0 +1,10 @@
+"""
+Sets up a bundle from the answers, for the batch.py --local tests.
+"""
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import blank_pdf, define, value
+
+def build():
+  documents = [make_document('form' + str(index), blank_pdf(pages=pages)) for index, pages in enumerate(value('pages'))]
+  define('user_bundle', make_bundle('user_bundle', documents[:1], filename='user'))
+  return {'court_bundle': make_bundle('court_bundle', documents, filename='court')}
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docassemble.ALDocument.local_runtime import install, reset
+install(force=True)
+
+import pytest
+from docassemble.ALDocument import al_document
+
+@pytest.fixture(autouse=True)
+def clean_state():
+  reset()
+  al_document.pdf_cache.clear()
+  al_document.table_cache.clear()
+  al_document._prerender_errors.clear()
+  yield
+  reset()
+
+@pytest.fixture
+def bundle():
+  """
+  A bundle with one enabled, one-page document.
+  """
+  from docassemble.ALDocument.benchmark import make_bundle, make_document
+  from docassemble.ALDocument.local_runtime import blank_pdf
+  return make_bundle('bundle', [make_document('doc', blank_pdf())])
@@ -0,0 +1,92 @@
+import pickle
+
+import pytest
+
+from docassemble.ALDocument import al_document
+from docassemble.ALDocument.al_document import ALAddendumField, ALAddendumFieldDict, load_overflow_spec
+from docassemble.ALDocument.local_runtime import DAObject, define, value
+
+def make_fields(*names):
+  fields = ALAddendumFieldDict('fields')
+  fields.from_list([{'field_name': name, 'overflow_trigger': 10} for name in names])
+  return fields
+
+def keys(fields):
+  return [field.field_name for field in fields]
+
+def test_fields_with_prefix():
+  fields = make_fields('users[1].address', 'users_count', 'users[0].name.first', 'users[0].names', 'users[0]', 'other')
+  assert keys(fields.fields_with_prefix('users')) == ['users[1].address', 'users[0].name.first', 'users[0].names', 'users[0]']
+  assert keys(fields.fields_with_prefix('users[0]')) == ['users[0].name.first', 'users[0].names', 'users[0]']
+  assert keys(fields.fields_with_prefix('users[0].name')) == ['users[0].name.first']
+  assert keys(fields.fields_with_prefix('users_count')) == ['users_count']
+  assert fields.fields_with_prefix('missing') == []
+
+def test_prefix_index_follows_changes():
+  fields = make_fields('users[0].name.first')
+  assert len(fields.fields_with_prefix('users')) == 1
+  fields['users[1].name.first'] = ALAddendumField('new', field_name='users[1].name.first', overflow_trigger=5)
+  assert keys(fields.fields_with_prefix('users')) == ['users[0].name.first', 'users[1].name.first']
+  del fields['users[0].name.first']
+  assert keys(fields.fields_with_prefix('users')) == ['users[1].name.first']
+  fields.pop('users[1].name.first')
+  assert fields.fields_with_prefix('users') == []
+  fields.initializeObject('users[2].age')
+  assert keys(fields.fields_with_prefix('users')) == ['users[2].age']
+
+def test_spec_errors_are_reported_together():
+  with pytest.raises(ValueError) as error:
+    load_overflow_spec([{'field_name': 'a'}, {'overflow_trigger': 3}, {'field_name': 'b', 'overflow_trigger': 1}, {'field_name': 'b', 'overflow_trigger': 2}])
+  message = str(error.value)
+  assert 'entry 0' in message and 'entry 1' in message and 'entry 3' in message
+
+def test_data_in_init_loads_the_spec():
+  fields = ALAddendumFieldDict('fields', data=[{'field_name': 'x', 'overflow_trigger': 7, 'headers': [{'a': 'A'}]}])
+  assert fields['x'].overflow_trigger == 7
+  assert fields['x'].headers == [{'a': 'A'}]
+  assert fields.gathered
+
+def test_evaluate_only_refits_changed_values(monkeypatch):
+  define('short', 'short answer')
+  define('long', 'a long answer ' * 10)
+  fields = make_fields('short', 'long')
+  fitted = []
+  real_fit_text = al_document.fit_text
+  def fit_text(text, *pargs, **kwargs):
+    fitted.append(text)
+    return real_fit_text(text, *pargs, **kwargs)
+  monkeypatch.setattr(al_document, 'fit_text', fit_text)
+  first = fields.evaluate()
+  assert sorted(fitted) == sorted(['short answer', 'a long answer ' * 10])
+  del fitted[:]
+  assert fields.evaluate() == first
+  assert fitted == []
+  define('long', 'changed')
+  assert not fields.evaluate()['long'].overflows
+  assert fitted == ['changed']
+  # The remembered results aren't saved with the answers
+  del fitted[:]
+  assert pickle.loads(pickle.dumps(fields)).evaluate() == fields.evaluate()
+  assert sorted(fitted) == ['changed', 'short answer']
+
+def test_columns_keep_the_order_they_are_first_seen():
+  define('rows', [{'name': 'Ann', 'age': 30}, 'plain value', DAObject('row', name='Bob', phone='555'), {'email': 'c@example.com', 'age': 4}])
+  field = ALAddendumField('field', field_name='rows', overflow_trigger=0)
+  assert field.columns() == [{'name': 'name'}, {'age': 'age'}, {'phone': 'phone'}, {'email': 'email'}]
+
+def test_columns_are_reused_until_a_row_gains_an_attribute(monkeypatch):
+  row = DAObject('row', name='Ann')
+  define('rows', [row, DAObject('row2', name='Bob')])
+  field = ALAddendumField('field', field_name='rows', overflow_trigger=0)
+  inferred = []
+  real_infer_columns = al_document.infer_columns
+  monkeypatch.setattr(al_document, 'infer_columns', lambda rows: inferred.append(1) or real_infer_columns(rows))
+  first = field.columns()
+  assert field.columns() is first
+  assert inferred == [1]
+  row.amount = 5
+  assert field.columns() == [{'name': 'name'}, {'amount': 'amount'}]
+  assert inferred == [1, 1]
+  value('rows').append({'email': 'c@example.com'})
+  assert field.columns() == [{'name': 'name'}, {'amount': 'amount'}, {'email': 'email'}]
+  assert inferred == [1, 1, 1]
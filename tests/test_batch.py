@@ -0,0 +1,46 @@
+import json
+
+from PyPDF2 import PdfReader
+import pytest
+
+from docassemble.ALDocument import batch
+from docassemble.ALDocument.al_document import batch_document
+from docassemble.ALDocument.benchmark import make_bundle
+from docassemble.ALDocument.local_runtime import define
+
+def test_batch_document_only_accepts_plain_names():
+  bundle = make_bundle('court_bundle', [])
+  define('court_bundle', bundle)
+  define('other', 'text')
+  assert batch_document('court_bundle') is bundle
+  for name in ('court_bundle.elements', "__import__('os')", 'missing', 'other', '_private', 'class', ['court_bundle']):
+    with pytest.raises(ValueError):
+      batch_document(name)
+
+def test_local_batch(tmp_path):
+  answers = tmp_path / 'answers'
+  answers.mkdir()
+  (answers / 'case1.json').write_text(json.dumps({'pages': [1, 2]}))
+  (answers / 'case2.json').write_text(json.dumps({'pages': [3]}))
+  (answers / 'broken.json').write_text(json.dumps({}))
+  output = tmp_path / 'output'
+  manifest = tmp_path / 'manifest.jsonl'
+  status = batch.main(['--local', 'batch_builder:build', '--answers', str(answers), '--bundle', 'court_bundle', '--bundle', 'user_bundle',
+                       '--download', str(output), '--manifest', str(manifest), '--workers', '2'])
+  assert status == 1
+  entries = {entry['case']: entry for entry in map(json.loads, manifest.read_text().splitlines())}
+  assert entries['broken']['status'] == 'error'
+  assert entries['case1']['status'] == 'ok'
+  assert len(PdfReader(entries['case1']['files']['court_bundle']).pages) == 3
+  assert len(PdfReader(entries['case1']['files']['user_bundle']).pages) == 1
+  assert len(PdfReader(str(output / 'case2' / 'court_bundle.pdf')).pages) == 3
+
+def test_local_batch_rejects_unknown_keys(tmp_path):
+  answers = tmp_path / 'answers'
+  answers.mkdir()
+  (answers / 'case.json').write_text(json.dumps({'pages': [1]}))
+  manifest = tmp_path / 'manifest.jsonl'
+  batch.main(['--local', 'batch_builder:build', '--answers', str(answers), '--key', 'elements',
+              '--download', str(tmp_path / 'output'), '--manifest', str(manifest), '--workers', '1'])
+  entry = json.loads(manifest.read_text())
+  assert entry['status'] == 'error' and 'elements' in entry['error']
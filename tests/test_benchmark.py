@@ -0,0 +1,47 @@
+import json
+import os
+
+from docassemble.ALDocument import benchmark
+from docassemble.ALDocument.local_runtime import blank_pdf
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+TINY = {
+  'text_length': 700,
+  'rows': 5,
+  'docx_rows': 5,
+  'fields': 4,
+  'nesting': 3,
+  'documents': 3,
+}
+
+def run_tiny(monkeypatch):
+  monkeypatch.setitem(benchmark.SIZES, 'tiny', TINY)
+  return benchmark.run_benchmarks(blank_pdf(), sizes=['tiny'], repeat=1)
+
+def test_every_case_runs(monkeypatch):
+  results = run_tiny(monkeypatch)
+  assert [result for result in results if result['error']] == []
+  assert all(result['seconds'] is not None for result in results)
+
+def test_baseline_covers_every_case(monkeypatch):
+  cases = {result['case'] for result in run_tiny(monkeypatch)}
+  with open(BASELINE) as baseline_file:
+    baseline = json.load(baseline_file)
+  # The eager table is only timed at the realistic size
+  assert cases - {'as_pdf_list_table'} <= {item['case'] for item in baseline if item['size'] == 'extreme'}
+  assert cases <= {item['case'] for item in baseline if item['size'] == 'realistic'}
+
+def test_compare_to_baseline():
+  results = [{'case': 'safe_value', 'size': 'realistic', 'seconds': 2.0, 'bytes': None},
+             {'case': 'new case', 'size': 'realistic', 'seconds': 1.0, 'bytes': None}]
+  baseline = [{'case': 'safe_value', 'size': 'realistic', 'seconds': 1.0, 'bytes': 10}]
+  benchmark.compare_to_baseline(results, baseline)
+  assert results[0]['ratio'] == 2.0
+  assert results[0]['baseline_bytes'] == 10
+  assert results[1]['ratio'] is None
+
+def test_undefines_synthetic_answers(monkeypatch):
+  from docassemble.ALDocument.local_runtime import answers
+  run_tiny(monkeypatch)
+  assert answers == {}
@@ -0,0 +1,91 @@
+from docassemble.ALDocument import al_document
+from docassemble.ALDocument.al_document import ALDocument, ALDocumentBundleDict
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import blank_pdf, define
+
+def overflowing_document(name):
+  """
+  A document with an addendum and one field that overflows.
+  """
+  define(name + '_answer', 'a long answer ' * 10)
+  document = make_document(name, blank_pdf(filename=name + '.pdf'), has_addendum=True)
+  document.addendum = blank_pdf(filename=name + '_addendum.pdf')
+  document.overflow_fields.initializeObject(name + '_answer')
+  document.overflow_fields[name + '_answer'].overflow_trigger = 10
+  return document
+
+def filenames(files):
+  return [the_file.filename for the_file in files]
+
+def test_nested_bundle_keeps_its_combined_addendum():
+  inner = make_bundle('inner', [overflowing_document('a'), overflowing_document('b')], use_combined_addendum=True)
+  inner.combined_addendum = blank_pdf(filename='inner_addendum.pdf')
+  assert filenames(inner.as_flat_list()) == ['a.pdf', 'b.pdf', 'inner_addendum.pdf']
+  outer = make_bundle('outer', [inner, overflowing_document('c')])
+  assert filenames(outer.as_flat_list()) == ['a.pdf', 'b.pdf', 'inner_addendum.pdf', 'c.pdf', 'c_addendum.pdf']
+  assert outer.overflow_documents() == [inner[0], inner[1], outer[1]]
+  assert inner.overflow_documents() == [inner[0], inner[1]]
+
+def test_outer_combined_addendum_covers_nested_bundles():
+  inner = make_bundle('inner', [overflowing_document('a')], use_combined_addendum=True)
+  inner.combined_addendum = blank_pdf(filename='inner_addendum.pdf')
+  outer = make_bundle('outer', [inner, overflowing_document('b')], use_combined_addendum=True)
+  outer.combined_addendum = blank_pdf(filename='outer_addendum.pdf')
+  assert filenames(outer.as_flat_list()) == ['a.pdf', 'b.pdf', 'outer_addendum.pdf']
+
+def test_combined_addendum_is_left_out_without_overflow():
+  inner = make_bundle('inner', [make_document('a', blank_pdf(filename='a.pdf'))], use_combined_addendum=True)
+  outer = make_bundle('outer', [inner, make_document('b', blank_pdf(filename='b.pdf'))])
+  assert filenames(outer.as_flat_list()) == ['a.pdf', 'b.pdf']
+  inner.use_combined_addendum = False
+  assert [entry.combined for entry in outer.flat_index()] == [None, None]
+
+def test_deeply_nested_flat_list():
+  bundle = make_bundle('level0', [make_document('doc0', blank_pdf(filename='doc0.pdf'))])
+  for level in range(1, 300):
+    bundle = make_bundle('level' + str(level), [make_document('doc' + str(level), blank_pdf(filename='doc' + str(level) + '.pdf')), bundle])
+  assert filenames(bundle.as_flat_list()) == ['doc' + str(level) + '.pdf' for level in range(299, -1, -1)]
+
+def test_disabled_nested_bundle_is_left_out():
+  inner = make_bundle('inner', [make_document('a', blank_pdf(filename='a.pdf'))], enabled=False)
+  outer = make_bundle('outer', [make_document('b', blank_pdf(filename='b.pdf')), inner])
+  assert filenames(outer.as_flat_list()) == ['b.pdf']
+  assert [entry.enabled for entry in outer.flat_index()] == [True, False]
+  assert outer.enabled_members() == [outer[0]]
+  inner.enabled = True
+  assert filenames(outer.as_flat_list()) == ['b.pdf', 'a.pdf']
+
+def test_pdf_list_drops_disabled_members():
+  inner = make_bundle('inner', [make_document('a', blank_pdf()), make_document('b', blank_pdf(), enabled=False)])
+  empty = make_bundle('empty', [make_document('c', blank_pdf(), enabled=False)])
+  outer = make_bundle('outer', [make_document('d', blank_pdf(), enabled=False), inner, empty, make_document('e', blank_pdf())])
+  assert filenames(outer.as_pdf_list()) == ['inner.pdf', 'e.pdf']
+  assert filenames(outer.as_pdf_list(concurrent=True)) == ['inner.pdf', 'e.pdf']
+
+def test_repeated_nested_bundle_is_included_once():
+  shared = make_bundle('shared', [make_document('a', blank_pdf(filename='a.pdf'))])
+  inner = make_bundle('inner', [shared, make_document('b', blank_pdf(filename='b.pdf')), shared])
+  outer = make_bundle('outer', [inner, shared])
+  assert filenames(outer.as_flat_list()) == ['a.pdf', 'b.pdf']
+  assert [entry.member for entry in outer.flat_index()] == [inner, inner]
+  assert outer.enabled_members() == [inner]
+
+def test_shared_document_is_rendered_once_for_all_bundles(monkeypatch):
+  # Without fingerprints, nothing is reused from the PDF cache or the answers
+  monkeypatch.setattr(al_document, 'file_fingerprint', lambda inputs: None)
+  checked = []
+  real_has_overflow = ALDocument.has_overflow
+  monkeypatch.setattr(ALDocument, 'has_overflow', lambda self: checked.append(self.instanceName) or real_has_overflow(self))
+  concatenated = []
+  real_pdf_concatenate = al_document.pdf_concatenate
+  monkeypatch.setattr(al_document, 'pdf_concatenate', lambda inputs, **kwargs: concatenated.append(kwargs.get('filename')) or real_pdf_concatenate(inputs, **kwargs))
+  shared = overflowing_document('shared')
+  bundles = ALDocumentBundleDict('bundles')
+  bundles['court_bundle'] = make_bundle('court_bundle', [shared, make_document('court', blank_pdf())])
+  bundles['user_bundle'] = make_bundle('user_bundle', [make_document('user', blank_pdf()), shared])
+  pdf_lists = bundles.as_pdf_lists()
+  assert filenames(pdf_lists['court_bundle']) == ['shared.pdf', 'court.pdf']
+  assert filenames(pdf_lists['user_bundle']) == ['user.pdf', 'shared.pdf']
+  assert pdf_lists['court_bundle'][0] is pdf_lists['user_bundle'][1]
+  assert checked == ['shared']
+  assert sorted(concatenated) == ['court.pdf', 'shared.pdf', 'user.pdf']
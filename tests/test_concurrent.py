@@ -0,0 +1,79 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from docassemble.ALDocument import al_document
+from docassemble.ALDocument.al_document import in_thread_context
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import blank_pdf, this_thread
+
+def test_concurrent_list_matches_sequential():
+  documents = [make_document('doc' + str(index), blank_pdf(pages=index + 1)) for index in range(5)]
+  bundle = make_bundle('bundle', documents)
+  sequential = bundle.as_pdf_list()
+  al_document.pdf_cache.clear()
+  concurrent = bundle.as_pdf_list(concurrent=True, max_workers=3)
+  assert [pdf.title for pdf in concurrent] == [pdf.title for pdf in sequential]
+  assert [pdf.filename for pdf in concurrent] == ['doc0.pdf', 'doc1.pdf', 'doc2.pdf', 'doc3.pdf', 'doc4.pdf']
+
+def test_nested_bundle_keeps_its_batch_limit(monkeypatch):
+  limits = []
+  def fake_concatenate(inputs, key='final', filename='file.pdf', stream_over_bytes=None):
+    limits.append((filename, stream_over_bytes))
+    return blank_pdf(filename=filename)
+  monkeypatch.setattr(al_document, 'concatenate_cached', fake_concatenate)
+  nested = make_bundle('nested', [make_document('a', blank_pdf()), make_document('b', blank_pdf())], max_concatenate_bytes=1000)
+  bundle = make_bundle('bundle', [make_document('c', blank_pdf()), nested])
+  bundle.as_pdf_list(concurrent=True)
+  assert sorted(limits) == [('c.pdf', None), ('nested.pdf', 1000)]
+
+def test_errors_are_raised_in_bundle_order(monkeypatch):
+  def failing(inputs, key='final', filename='file.pdf', stream_over_bytes=None):
+    raise ValueError(filename)
+  monkeypatch.setattr(al_document, 'concatenate_cached', failing)
+  bundle = make_bundle('bundle', [make_document('a', blank_pdf()), make_document('b', blank_pdf())])
+  with pytest.raises(ValueError) as error:
+    bundle.as_pdf_list(concurrent=True)
+  assert str(error.value) == 'a.pdf'
+
+def test_thread_context_is_copied_and_restored():
+  this_thread.current_info = {'session': 'abc'}
+  seen = {}
+  def read_context():
+    seen['info'] = this_thread.current_info
+    this_thread.extra = True
+  worker_context = {}
+  def worker():
+    this_thread.mine = 1
+    wrapped()
+    worker_context.update(this_thread.__dict__)
+  wrapped = in_thread_context(read_context)
+  thread = threading.Thread(target=worker)
+  thread.start()
+  thread.join()
+  del this_thread.current_info
+  assert seen['info'] == {'session': 'abc'}
+  assert worker_context == {'mine': 1}
+
+def test_worker_runs_in_a_new_app_context(monkeypatch):
+  events = []
+  class AppContext(object):
+    def __enter__(self):
+      events.append(('enter', threading.current_thread().name))
+    def __exit__(self, *exc_info):
+      events.append(('exit', threading.current_thread().name))
+  class App(object):
+    def app_context(self):
+      return AppContext()
+  app = App()
+  flask = types.ModuleType('flask')
+  flask.has_app_context = lambda: True
+  flask.current_app = types.SimpleNamespace(_get_current_object=lambda: app)
+  monkeypatch.setitem(sys.modules, 'flask', flask)
+  wrapped = in_thread_context(lambda: events.append(('run', threading.current_thread().name)))
+  thread = threading.Thread(target=wrapped, name='worker')
+  thread.start()
+  thread.join()
+  assert events == [('enter', 'worker'), ('run', 'worker'), ('exit', 'worker')]
@@ -0,0 +1,81 @@
+import pickle
+
+import pytest
+
+from docassemble.ALDocument import al_document
+from docassemble.ALDocument.al_document import document_key
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import blank_pdf
+
+def test_document_key_only_accepts_attachment_keys():
+  assert document_key('final') == 'final'
+  assert document_key('preview') == 'preview'
+  for key in ('addendum', '__class__', None, ''):
+    with pytest.raises(ValueError):
+      document_key(key)
+
+def test_lazy_table_links_to_the_download_action():
+  bundle = make_bundle('bundle', [make_document('motion', blank_pdf(), title='Motion')])
+  html = bundle.as_pdf_list_table(lazy=True)
+  assert 'al_download_pdf' in html
+  assert 'Motion' in html
+  assert 'uploadedfile' not in html
+
+def test_eager_table_links_to_the_pdf():
+  bundle = make_bundle('bundle', [make_document('motion', blank_pdf(), title='Motion')])
+  html = bundle.as_pdf_list_table()
+  assert '/uploadedfile/' in html and 'motion.pdf' in html
+
+def test_document_pdf_is_kept_in_the_answers():
+  document = make_document('motion', blank_pdf())
+  pdf = document.as_pdf()
+  # As if the next click were served by another process
+  al_document.pdf_cache.clear()
+  restored = pickle.loads(pickle.dumps(document))
+  assert restored.as_pdf().number == pdf.number
+  restored['final'] = blank_pdf()
+  assert restored.as_pdf().number != pdf.number
+
+def count_rows(monkeypatch):
+  rows = []
+  real_table_row = al_document.table_row
+  monkeypatch.setattr(al_document, 'table_row', lambda *pargs, **kwargs: rows.append(1) or real_table_row(*pargs, **kwargs))
+  return rows
+
+def test_table_is_reused_while_the_bundle_is_unchanged(monkeypatch):
+  rows = count_rows(monkeypatch)
+  bundle = make_bundle('bundle', [make_document('a', blank_pdf()), make_document('b', blank_pdf())])
+  html = bundle.as_pdf_list_table()
+  assert len(rows) == 2
+  assert bundle.as_pdf_list_table() == html
+  assert len(rows) == 2
+  assert al_document.table_cache.stats()['size'] == 1
+
+def test_table_is_rebuilt_when_a_member_changes(monkeypatch):
+  rows = count_rows(monkeypatch)
+  bundle = make_bundle('bundle', [make_document('a', blank_pdf(), title='First'), make_document('b', blank_pdf())])
+  bundle.as_pdf_list_table(lazy=True)
+  bundle[1].enabled = False
+  assert 'al_download_pdf' in bundle.as_pdf_list_table(lazy=True)
+  assert len(rows) == 3
+  bundle[0].title = 'Renamed'
+  assert 'Renamed' in bundle.as_pdf_list_table(lazy=True)
+  assert len(rows) == 4
+
+def test_table_is_rebuilt_when_an_attachment_is_assembled_again(monkeypatch):
+  rows = count_rows(monkeypatch)
+  bundle = make_bundle('bundle', [make_document('a', blank_pdf())])
+  first = bundle.as_pdf_list_table()
+  bundle[0]['final'] = blank_pdf()
+  second = bundle.as_pdf_list_table()
+  assert len(rows) == 2
+  assert second != first
+
+def test_table_is_not_cached_without_a_fingerprint(monkeypatch):
+  rows = count_rows(monkeypatch)
+  monkeypatch.setattr(al_document, 'file_fingerprint', lambda inputs: None)
+  bundle = make_bundle('bundle', [make_document('a', blank_pdf())])
+  bundle.as_pdf_list_table()
+  bundle.as_pdf_list_table()
+  assert len(rows) == 2
+  assert al_document.table_cache.stats()['size'] == 0
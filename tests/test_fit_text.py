@@ -0,0 +1,74 @@
+import random
+import re
+
+from docassemble.ALDocument.al_document import ALAddendumField, fit_text
+from docassemble.ALDocument.local_runtime import define
+
+def old_safe_value(value, overflow_trigger, overflow_message="", input_width=80, preserve_newlines=False):
+  """
+  ALAddendumField.safe_value() for a string, as it was before fit_text().
+  """
+  if len(value) <= overflow_trigger and (value.count('\r') + value.count('\n')) == 0:
+    return value
+  max_lines = int(max(overflow_trigger - len(overflow_message), 0) / input_width) + 1
+  max_chars = max(overflow_trigger - len(overflow_message), 0)
+  if preserve_newlines and max_lines > 1:
+    value = re.sub(r"[\r\n]+|\r+|\n+", r"\n", value).rstrip()
+    line = 1
+    retval = ""
+    paras = value.split('\n')
+    para = 0
+    while line <= max_lines and para < len(paras):
+      if len(paras[para]) <= input_width:
+        retval += paras[para] + "\n"
+        line += 1
+        para += 1
+      else:
+        while line <= max_lines and len(paras[para]):
+          retval += paras[para][:input_width]
+          paras[para] = paras[para][input_width:]
+          line += 1
+        if not len(paras[para]):
+          para += 1
+          retval += "\n"
+    if len(paras) > para:
+      return retval.rstrip() + overflow_message
+    else:
+      return retval
+  if len(value) > overflow_trigger:
+    return re.sub(r"[\r\n]+|\r+|\n+", " ", value).rstrip()[:max_chars] + overflow_message
+  else:
+    return re.sub(r"[\r\n]+|\r+|\n+", " ", value).rstrip()[:max_chars]
+
+def old_overflow_value(value, overflow_trigger, overflow_message="", input_width=80):
+  """
+  ALAddendumField.overflow_value() for a string, as it was before fit_text().
+  """
+  last_char = max(len(old_safe_value(value, overflow_trigger, overflow_message=overflow_message, input_width=input_width, preserve_newlines=True)) - (max(len(overflow_message) - 1, 0)), 0)
+  return value[last_char:]
+
+def random_text(generator):
+  pieces = ['word', 'a', ' ', '  ', '\n', '\r\n', '\n\n', '\r', 'x' * generator.randint(1, 120)]
+  return ''.join(generator.choice(pieces) for _ in range(generator.randint(0, 60)))
+
+def test_fit_text_matches_the_old_safe_and_overflow_values():
+  generator = random.Random(20240518)
+  for _ in range(5000):
+    text = random_text(generator)
+    overflow_trigger = generator.randint(0, 400)
+    input_width = generator.randint(1, 100)
+    overflow_message = generator.choice(['', '.', '...', ' (see addendum)'])
+    case = (text, overflow_trigger, input_width, overflow_message)
+    for preserve_newlines in (False, True):
+      fit = fit_text(text, overflow_trigger, input_width=input_width, overflow_message=overflow_message, preserve_newlines=preserve_newlines)
+      assert fit.safe_value == old_safe_value(text, overflow_trigger, overflow_message, input_width, preserve_newlines), case
+    assert fit.overflow_value == old_overflow_value(text, overflow_trigger, overflow_message, input_width), case
+
+def test_field_methods_match_the_old_ones():
+  text = 'First paragraph.\r\n\r\n' + 'A long second paragraph. ' * 20 + '\nLast line.'
+  define('narrative', text)
+  field = ALAddendumField('field', field_name='narrative', overflow_trigger=200)
+  for input_width in (20, 80, 300):
+    for preserve_newlines in (False, True):
+      assert field.safe_value(overflow_message='...', input_width=input_width, preserve_newlines=preserve_newlines) == old_safe_value(text, 200, '...', input_width, preserve_newlines)
+    assert field.overflow_value(overflow_message='...', input_width=input_width) == old_overflow_value(text, 200, '...', input_width)
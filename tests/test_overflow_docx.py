@@ -0,0 +1,36 @@
+import docx
+
+from docassemble.ALDocument.al_document import ALAddendumField, jinja_escape
+from docassemble.ALDocument.local_runtime import define
+
+def make_field(rows):
+  define('rows', rows)
+  return ALAddendumField('field', field_name='rows', overflow_trigger=0)
+
+def table_text(the_file):
+  table = docx.Document(the_file.path()).tables[0]
+  return [[cell.text for cell in row.cells] for row in table.rows]
+
+def test_jinja_escape():
+  assert jinja_escape('{{ user }} and {% if x %}') == "{{ '{' }}{{ '{' }} user {{ '}' }}{{ '}' }} and {{ '{' }}% if x %{{ '}' }}"
+  assert jinja_escape('no braces') == 'no braces'
+
+def test_table_is_filled_in_order():
+  field = make_field([{'name': 'Ann', 'amount': '1'}, {'name': 'Bob', 'amount': '2'}, {'name': 'Cy', 'amount': '3'}])
+  text = table_text(field.overflow_docx_file())
+  assert text[1:] == [['Ann', '1'], ['Bob', '2'], ['Cy', '3']]
+
+def test_answers_are_escaped_for_templates():
+  field = make_field([{'name': '{{ secret }}', 'amount': '{% if x %}'}])
+  assert table_text(field.overflow_docx_file())[1] == ['{{ secret }}', '{% if x %}']
+  assert table_text(field.overflow_docx_file(escape_jinja=True))[1] == [jinja_escape('{{ secret }}'), jinja_escape('{% if x %}')]
+  assert field.overflow_docx() == '[include_docx_template ' + field.overflow_docx_file(escape_jinja=True).path() + ']'
+
+def test_file_is_reused_until_the_text_changes():
+  field = make_field([{'name': 'Ann'}, {'name': 'Bob'}])
+  first = field.overflow_docx_file()
+  assert field.overflow_docx_file().number == first.number
+  define('rows', [{'name': 'Ann'}, {'name': 'Bea'}])
+  changed = field.overflow_docx_file()
+  assert changed.number != first.number
+  assert table_text(changed)[1:] == [['Ann'], ['Bea']]
@@ -0,0 +1,100 @@
+import random
+
+from docassemble.ALDocument.al_document import ALAddendumField
+from docassemble.ALDocument.local_runtime import DAObject, define
+
+def old_overflow_markdown(columns, overflow):
+  """
+  ALAddendumField.overflow_markdown() as it was before it was streamed, with
+  its columns() and overflow_value() results passed in.
+  """
+  if not columns:
+    if overflow:
+      retval = "* "
+      retval += "\n* ".join(overflow)
+      return retval + "\n"
+    else:
+      return ""
+  num_columns = len(columns)
+  header = " | ".join([list(item.items())[0][1] for item in columns])
+  header += "\n"
+  header += "|".join(["-----"] * num_columns)
+  flattened_columns = []
+  for column in columns:
+    flattened_columns.append(list(column.items())[0][0])
+  rows = "\n"
+  for row in overflow:
+    if isinstance(row, dict):
+      row_values = []
+      for column in flattened_columns:
+        row_values.append(str(row.get(column, '')))
+      rows += "|".join(row_values)
+    else:
+      row_values = []
+      for column in flattened_columns:
+        try:
+          row_values.append(str(getattr(row, column, '')))
+        except:
+          row_values.append("")
+      rows += "|".join(row_values)
+    rows += "\n"
+  return header + rows
+
+KEYS = ['name', 'amount', 'date', 'note']
+
+def random_cell(generator):
+  return generator.choice([generator.randint(0, 10 ** 6), 'Item ' + str(generator.randint(0, 99)), '', 'a | b', 'café'])
+
+def random_dict_rows(generator, count):
+  first = generator.sample(KEYS, generator.randint(1, len(KEYS)))
+  # Later rows only use the first row's keys, which old columns() read
+  return [{key: random_cell(generator) for key in (first if index == 0 else generator.sample(first, generator.randint(0, len(first))))}
+          for index in range(count)]
+
+def random_object_rows(generator, count):
+  rows = []
+  for index in range(count):
+    row = DAObject('rows[' + str(index) + ']')
+    for key in generator.sample(KEYS, generator.randint(1, len(KEYS))):
+      setattr(row, key, random_cell(generator))
+    rows.append(row)
+  return rows
+
+def check(field, chunk_size):
+  expected = old_overflow_markdown(field.columns(), field.overflow_value())
+  assert field.overflow_markdown() == expected
+  assert "".join(field.overflow_markdown_chunks(chunk_size=chunk_size)) == expected
+
+def test_list_markdown_matches_the_old_one():
+  generator = random.Random(1)
+  for _ in range(200):
+    define('rows', ['item ' + str(generator.randint(0, 99)) for _ in range(generator.randint(0, 40))])
+    check(ALAddendumField('field', field_name='rows', overflow_trigger=generator.randint(0, 10)), generator.randint(1, 7))
+
+def test_dict_row_markdown_matches_the_old_one():
+  generator = random.Random(2)
+  for _ in range(200):
+    define('rows', random_dict_rows(generator, generator.randint(1, 40)))
+    check(ALAddendumField('field', field_name='rows', overflow_trigger=generator.randint(0, 10)), generator.randint(1, 7))
+
+def test_object_row_markdown_matches_the_old_one():
+  generator = random.Random(3)
+  for _ in range(200):
+    rows = random_object_rows(generator, generator.randint(1, 40))
+    define('rows', rows)
+    field = ALAddendumField('field', field_name='rows', overflow_trigger=generator.randint(0, 10))
+    # The old columns() only read the first row, in no particular order
+    first_row = set(rows[0].__dict__) - {'has_nonrandom_instance_name', 'instanceName', 'attrList'}
+    assert first_row <= {list(column)[0] for column in field.columns()}
+    check(field, generator.randint(1, 7))
+
+def test_header_markdown_matches_the_old_one():
+  generator = random.Random(4)
+  for _ in range(200):
+    headers = [{key: key.title()} for key in generator.sample(KEYS, generator.randint(1, len(KEYS)))]
+    if generator.random() < 0.5:
+      rows = random_dict_rows(generator, generator.randint(0, 40))
+    else:
+      rows = random_object_rows(generator, generator.randint(0, 40))
+    define('rows', rows)
+    check(ALAddendumField('field', field_name='rows', overflow_trigger=generator.randint(0, 10), headers=headers), generator.randint(1, 7))
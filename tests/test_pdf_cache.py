@@ -0,0 +1,58 @@
+import os
+import time
+
+from docassemble.ALDocument.al_document import ALCache, concatenate_cached, pdf_cache
+from docassemble.ALDocument.local_runtime import DAFile, DAFileCollection, blank_pdf
+
+def test_repeat_concatenation_is_a_hit():
+  page = blank_pdf()
+  hits = pdf_cache.stats()['hits']
+  first = concatenate_cached([page, page], filename='a.pdf')
+  second = concatenate_cached([page, page], filename='a.pdf')
+  assert first is second
+  assert pdf_cache.stats()['hits'] == hits + 1
+  assert concatenate_cached([page, page], key='preview', filename='a.pdf') is not first
+  assert concatenate_cached([page, blank_pdf()], filename='a.pdf') is not first
+
+def test_docx_only_collection_uses_file_numbers():
+  cache = ALCache()
+  collection = DAFileCollection('attachment')
+  assert cache.make_key([collection]) is None
+  collection.docx = DAFile()
+  collection.docx.initialize(filename='a.docx')
+  first_key = cache.make_key([collection])
+  assert first_key is not None
+  collection.docx = DAFile()
+  collection.docx.initialize(filename='a.docx')
+  assert cache.make_key([collection]) != first_key
+
+def test_path_changes_when_file_changes(tmp_path):
+  cache = ALCache()
+  path = str(tmp_path / 'a.pdf')
+  with open(path, 'wb') as the_file:
+    the_file.write(b'one')
+  first_key = cache.make_key([path])
+  with open(path, 'wb') as the_file:
+    the_file.write(b'three')
+  os.utime(path, (time.time() + 5, time.time() + 5))
+  assert cache.make_key([path]) != first_key
+  assert cache.make_key([str(tmp_path / 'missing.pdf')]) is None
+
+def test_unidentifiable_inputs_are_not_cached():
+  page = blank_pdf()
+  unnumbered = DAFile('unnumbered')
+  unnumbered.file_path = page.path()
+  unnumbered.filename = 'page.pdf'
+  first = concatenate_cached([unnumbered], filename='a.pdf')
+  assert concatenate_cached([unnumbered], filename='a.pdf') is not first
+  assert pdf_cache.stats()['size'] == 0
+
+def test_eviction_by_size_and_age():
+  cache = ALCache(max_entries=2, max_age=60)
+  for name in ('a', 'b', 'c'):
+    cache.put(name, name)
+  assert cache.get('a') is None
+  assert cache.get('c') == 'c'
+  assert cache.stats()['evictions'] == 1
+  cache.max_age = -1
+  assert cache.get('c') is None
@@ -0,0 +1,47 @@
+from reportlab.pdfgen import canvas
+
+from docassemble.ALDocument import al_document, pdf_triggers
+from docassemble.ALDocument.al_document import ALAddendumFieldDict, is_variable_name
+
+def make_template(path, names):
+  pdf = canvas.Canvas(path)
+  for index, name in enumerate(names):
+    pdf.acroForm.textfield(name=name, x=50, y=700 - index * 40, width=200, height=20, fontSize=10)
+  pdf.showPage()
+  pdf.save()
+  return path
+
+def test_is_variable_name():
+  for name in ('users[0].name.first', "x['any key']", 'topmostSubform[0].Page1[0].f1_01[0]'):
+    assert is_variable_name(name)
+  for name in ('Text Field 1', 'def', 'x[0].class', '_hidden', 'a.b[c]', '1st'):
+    assert not is_variable_name(name)
+
+def test_invalid_field_names_are_skipped_and_logged(tmp_path, monkeypatch):
+  monkeypatch.setattr(pdf_triggers, 'CACHE_DIR', str(tmp_path / 'cache'))
+  template = make_template(str(tmp_path / 'form.pdf'), ['user.name', 'Text Field 1', 'class'])
+  messages = []
+  monkeypatch.setattr(al_document, 'log', lambda message, *pargs: messages.append(message))
+  fields = ALAddendumFieldDict('fields')
+  fields.from_pdf_template(template)
+  assert list(fields.keys()) == ['user.name']
+  assert fields['user.name'].overflow_trigger > 0
+  assert len(messages) == 1 and "'Text Field 1'" in messages[0] and "'class'" in messages[0]
+  mapped = ALAddendumFieldDict('mapped')
+  mapped.from_pdf_template(template, field_map={'Text Field 1': 'other_user.name'})
+  assert list(mapped.keys()) == ['other_user.name']
+
+def test_cache_is_keyed_by_estimator_version(tmp_path, monkeypatch):
+  monkeypatch.setattr(pdf_triggers, 'CACHE_DIR', str(tmp_path / 'cache'))
+  monkeypatch.setattr(pdf_triggers, '_memory_cache', {})
+  template = make_template(str(tmp_path / 'form.pdf'), ['user.name'])
+  calls = []
+  real = pdf_triggers.read_pdf_fields
+  monkeypatch.setattr(pdf_triggers, 'read_pdf_fields', lambda path: calls.append(path) or real(path))
+  first = pdf_triggers.pdf_overflow_triggers(template)
+  monkeypatch.setattr(pdf_triggers, '_memory_cache', {})
+  assert pdf_triggers.pdf_overflow_triggers(template) == first
+  assert len(calls) == 1
+  monkeypatch.setattr(pdf_triggers, 'ESTIMATOR_VERSION', pdf_triggers.ESTIMATOR_VERSION + 1)
+  assert pdf_triggers.pdf_overflow_triggers(template) == first
+  assert len(calls) == 2
@@ -0,0 +1,58 @@
+import copy
+import pickle
+
+from docassemble.ALDocument.al_document import ALAddendumField, ALAddendumFieldDict, ALDocument, ALDocumentBundle, start_timing, stop_timing
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import blank_pdf, define
+
+class MyField(ALAddendumField):
+  pass
+
+class MyFieldDict(ALAddendumFieldDict):
+  pass
+
+class MyBundle(ALDocumentBundle):
+  pass
+
+
+def test_subclasses_pickle():
+  for obj in (MyField('field', field_name='x', overflow_trigger=3), MyFieldDict('fields'), MyBundle('bundle', elements=[])):
+    restored = pickle.loads(pickle.dumps(obj))
+    assert type(restored) is type(obj)
+    assert restored.instanceName == obj.instanceName
+
+def test_transient_caches_are_not_pickled():
+  define('rows', [{'a': 1}])
+  fields = ALAddendumFieldDict('fields')
+  fields.initializeObject('rows')
+  fields['rows'].overflow_trigger = 0
+  fields['rows'].columns()
+  fields.fields_with_prefix('rows')
+  bundle = make_bundle('bundle', [make_document('doc', blank_pdf())])
+  bundle.flat_index()
+  assert '_columns_state' not in pickle.loads(pickle.dumps(fields['rows'])).__dict__
+  assert '_prefix_index' not in pickle.loads(pickle.dumps(fields)).__dict__
+  assert '_flat_index' not in pickle.loads(pickle.dumps(bundle)).__dict__
+
+def test_fields_keep_their_names():
+  define('x', 'some text')
+  fields = ALAddendumFieldDict('doc.overflow_fields')
+  fields.initializeObject('x')
+  fields['x'].overflow_trigger = 4
+  for field in (copy.copy(fields['x']), pickle.loads(pickle.dumps(fields['x'])), pickle.loads(pickle.dumps(fields))['x']):
+    assert field.instanceName == "doc.overflow_fields['x']"
+    start_timing()
+    try:
+      assert field.safe_value() == 'some'
+    finally:
+      stop_timing()
+
+def test_evaluating_fields_does_not_grow_the_pickle():
+  document = make_document('doc', blank_pdf())
+  for index in range(20):
+    define('field' + str(index), 'x' * (100 + 20 * index))
+    document.overflow_fields.initializeObject('field' + str(index))
+    document.overflow_fields['field' + str(index)].overflow_trigger = 300
+  size = len(pickle.dumps(document))
+  assert document.has_overflow()
+  assert len(pickle.dumps(document)) == size
@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+import pickle
+
+from docassemble.ALDocument import al_document
+
+class ManualExecutor(object):
+  """
+  Runs submitted jobs only when run() is called.
+  """
+  def __init__(self):
+    self.jobs = []
+
+  def submit(self, function, *pargs, **kwargs):
+    future = Future()
+    self.jobs.append((future, function, pargs, kwargs))
+    return future
+
+  def run(self):
+    for future, function, pargs, kwargs in self.jobs:
+      try:
+        future.set_result(function(*pargs, **kwargs))
+      except Exception as err:
+        future.set_exception(err)
+    self.jobs = []
+
+def test_status_does_not_assemble(bundle, monkeypatch):
+  executor = ManualExecutor()
+  assert bundle.prerender_status() == 'not started'
+  assert bundle.start_prerender(executor=executor) == 'pending'
+  def fail(*pargs, **kwargs):
+    raise AssertionError('assembled the bundle')
+  monkeypatch.setattr(bundle, 'as_flat_list', fail)
+  assert bundle.prerender_status() == 'pending'
+  executor.run()
+  assert bundle.prerender_status() == 'ready'
+  assert al_document._prerender_jobs == {}
+
+def test_as_pdf_returns_the_prerendered_file(bundle):
+  executor = ManualExecutor()
+  bundle.start_prerender(executor=executor)
+  executor.run()
+  pdf = al_document.pdf_cache.get(bundle._prerender_keys['final'])
+  assert bundle.as_pdf().number == pdf.number
+
+def test_failed_jobs_are_not_kept(bundle, monkeypatch):
+  executor = ManualExecutor()
+  def broken(*pargs, **kwargs):
+    raise RuntimeError('broken PDF')
+  monkeypatch.setattr(al_document, 'concatenate_cached', broken)
+  bundle.start_prerender(executor=executor)
+  executor.run()
+  assert al_document._prerender_jobs == {}
+  assert bundle.prerender_status() == 'failed'
+  monkeypatch.undo()
+  assert bundle.start_prerender(executor=executor) == 'pending'
+  executor.run()
+  assert bundle.prerender_status() == 'ready'
+
+def test_built_file_is_kept_in_the_answers(bundle):
+  executor = ManualExecutor()
+  bundle.start_prerender(executor=executor)
+  executor.run()
+  pdf = bundle.as_pdf()
+  # As if the next request were served by another process
+  al_document.pdf_cache.clear()
+  restored = pickle.loads(pickle.dumps(bundle))
+  assert restored.prerender_status() == 'ready'
+  assert restored.as_pdf().number == pdf.number
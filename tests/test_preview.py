@@ -0,0 +1,56 @@
+import pickle
+
+from PyPDF2 import PdfReader
+
+from docassemble.ALDocument import al_document
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import DAFile, blank_pdf
+
+from test_streaming_concatenate import write_image_pdf
+
+def test_preview_caps_pages_before_concatenating(monkeypatch):
+  documents = [make_document('doc' + str(index), blank_pdf(pages=3)) for index in range(4)]
+  bundle = make_bundle('bundle', documents, title='Bundle')
+  read = []
+  import docassemble.ALDocument.pdf_stream as pdf_stream
+  real_add_pdf = pdf_stream.StreamingPDFWriter.add_pdf
+  def add_pdf(writer, path, **kwargs):
+    read.append(path)
+    return real_add_pdf(writer, path, **kwargs)
+  monkeypatch.setattr(pdf_stream.StreamingPDFWriter, 'add_pdf', add_pdf)
+  pdf = bundle.preview(max_pages=4)
+  assert len(PdfReader(pdf.path()).pages) == 4
+  assert read == [documents[0]['preview'].path(), documents[1]['preview'].path()]
+  assert pdf.title == 'Bundle'
+
+def test_preview_skip_images(tmp_path):
+  path = str(tmp_path / 'images.pdf')
+  write_image_pdf(path, pages=2, image_side=50)
+  page = DAFile('page')
+  page.initialize(filename='doc.pdf')
+  page.copy_into(path)
+  bundle = make_bundle('bundle', [make_document('doc', page)])
+  pdf = bundle.preview(skip_images=True)
+  pages = PdfReader(pdf.path()).pages
+  assert len(pages) == 2
+  assert [page['/Resources']['/XObject']['/Im0'].get_object()['/Width'] for page in pages] == [1, 1]
+
+def test_preview_is_reused_from_the_interview_answers():
+  bundle = make_bundle('bundle', [make_document('doc', blank_pdf(pages=2))])
+  pdf = bundle.preview(max_pages=1)
+  # As if the next request were served by another process
+  al_document.pdf_cache.clear()
+  restored = pickle.loads(pickle.dumps(bundle))
+  assert restored.preview(max_pages=1).number == pdf.number
+  assert restored.preview(max_pages=1, skip_images=True).number != pdf.number
+
+def test_thumbnails_are_reused_from_the_interview_answers(monkeypatch, tmp_path):
+  image = tmp_path / 'page.png'
+  image.write_bytes(b'png')
+  monkeypatch.setattr(DAFile, 'page_path', lambda self, page, prefix: str(image), raising=False)
+  bundle = make_bundle('bundle', [make_document('doc', blank_pdf(pages=2))])
+  thumbnails = bundle.preview_thumbnails(max_pages=3)
+  assert len(thumbnails) == 2
+  al_document.pdf_cache.clear()
+  restored = pickle.loads(pickle.dumps(bundle))
+  assert [thumbnail.number for thumbnail in restored.preview_thumbnails(max_pages=3)] == [thumbnail.number for thumbnail in thumbnails]
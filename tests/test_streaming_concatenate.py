@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from PyPDF2 import PdfReader
+
+from docassemble.ALDocument.al_document import concatenate_cached, concatenate_streaming
+from docassemble.ALDocument.local_runtime import DAFileCollection, blank_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_image_pdf(path, pages, image_side=320):
+  """
+  Write a PDF whose pages each show a different image_side x image_side gray
+  image of random, incompressible bytes.
+  """
+  objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None]
+  kids = []
+  for page in range(pages):
+    image = os.urandom(image_side * image_side)
+    objects.append(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8 /Length %d >>\nstream\n' % (image_side, image_side, len(image)) + image + b'\nendstream')
+    image_number = len(objects)
+    content = b'q 300 0 0 300 100 400 cm /Im0 Do Q'
+    objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+    content_number = len(objects)
+    objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>' % (image_number, content_number))
+    kids.append(len(objects))
+  objects[1] = b'<< /Type /Pages /Count %d /Kids [%s] >>' % (len(kids), b' '.join(b'%d 0 R' % kid for kid in kids))
+  with open(path, 'wb') as pdf:
+    pdf.write(b'%PDF-1.7\n')
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+      offsets.append(pdf.tell())
+      pdf.write(b'%d 0 obj\n' % number + obj + b'\nendobj\n')
+    xref = pdf.tell()
+    pdf.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+      pdf.write(b'%010d 00000 n \n' % offset)
+    pdf.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+def test_streaming_keeps_pages_in_order(tmp_path):
+  paths = []
+  for index in range(3):
+    path = str(tmp_path / ('input' + str(index) + '.pdf'))
+    write_image_pdf(path, pages=index + 1, image_side=8)
+    paths.append(path)
+  collection = DAFileCollection('collection')
+  collection.pdf = blank_pdf(pages=2)
+  pdf = concatenate_streaming([paths[0], [paths[1], collection], paths[2]], filename='bundle.pdf')
+  reader = PdfReader(pdf.path(), strict=True)
+  assert len(reader.pages) == 1 + 2 + 2 + 3
+  widths = []
+  for page in reader.pages:
+    images = page.get('/Resources', {}).get('/XObject')
+    widths.append(images['/Im0'].get_object()['/Width'] if images else None)
+  assert widths == [8, 8, 8, None, None, 8, 8, 8]
+  assert pdf.filename == 'bundle.pdf'
+
+def test_streaming_max_pages_stops_early(tmp_path):
+  paths = []
+  for index in range(3):
+    path = str(tmp_path / ('input' + str(index) + '.pdf'))
+    write_image_pdf(path, pages=4, image_side=8)
+    paths.append(path)
+  pdf = concatenate_streaming(paths, max_pages=6)
+  assert len(PdfReader(pdf.path()).pages) == 6
+
+def test_concatenate_cached_streams_large_inputs(tmp_path, monkeypatch):
+  path = str(tmp_path / 'input.pdf')
+  write_image_pdf(path, pages=2, image_side=8)
+  calls = []
+  import docassemble.ALDocument.al_document as al_document
+  real = al_document.concatenate_streaming
+  monkeypatch.setattr(al_document, 'concatenate_streaming', lambda *pargs, **kwargs: calls.append(1) or real(*pargs, **kwargs))
+  concatenate_cached([path], filename='small.pdf', stream_over_bytes=10 ** 9)
+  assert calls == []
+  pdf = concatenate_cached([path], filename='large.pdf', stream_over_bytes=100)
+  assert calls == [1]
+  assert len(PdfReader(pdf.path()).pages) == 2
+
+MEASURE = textwrap.dedent('''
+  import json, resource, sys
+  sys.path.insert(0, sys.argv[1])
+  from docassemble.ALDocument.local_runtime import install
+  install(force=True)
+  from docassemble.ALDocument.al_document import concatenate_streaming
+  paths = json.loads(sys.argv[2])
+  before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  pdf = concatenate_streaming(paths, filename='bundle.pdf')
+  after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  print(json.dumps({'growth_kb': after - before, 'path': pdf.path()}))
+''')
+
+def test_streaming_peak_memory_stays_flat(tmp_path):
+  paths = []
+  for index in range(50):
+    path = str(tmp_path / ('input' + str(index) + '.pdf'))
+    write_image_pdf(path, pages=10)
+    paths.append(path)
+  total_kb = sum(os.path.getsize(path) for path in paths) // 1024
+  result = subprocess.run([sys.executable, '-c', MEASURE, ROOT, json.dumps(paths)], capture_output=True, text=True, check=True)
+  measured = json.loads(result.stdout.strip().splitlines()[-1])
+  assert len(PdfReader(measured['path']).pages) == 500
+  # About 50 MB of input; the peak grows by a small fraction of it
+  assert measured['growth_kb'] < total_kb / 10, measured
+  os.remove(measured['path'])
@@ -0,0 +1,40 @@
+import pytest
+
+from docassemble.ALDocument import al_document
+from docassemble.ALDocument.al_document import recording_timing, start_timing, stop_timing, timing_report
+
+def test_recording_timing_is_scoped(bundle):
+  with recording_timing() as timing:
+    bundle.as_pdf()
+  assert timing['report']['children'][0]['name'] == 'as_pdf bundle'
+  assert timing_report() is None
+  bundle.as_pdf()
+  assert timing_report() is None
+
+def test_recording_timing_stops_on_error():
+  with pytest.raises(ValueError):
+    with recording_timing() as timing:
+      raise ValueError()
+  assert timing['report'] is not None
+  assert timing_report() is None
+
+def test_bundle_report_is_read_only(bundle):
+  assert bundle.timing_report() is None
+  with recording_timing() as timing:
+    bundle.as_pdf()
+    report = bundle.timing_report()
+    assert [child['name'] for child in report['children']] == ['as_pdf bundle']
+    bundle.as_pdf()
+    assert bundle.timing_report()['children'][0]['calls'] == 2
+  assert timing['report']['children'][0]['calls'] == 2
+  assert timing_report() is None
+
+def test_nested_recording_leaves_the_outer_one_running(bundle):
+  start_timing()
+  try:
+    with recording_timing() as inner:
+      bundle.as_pdf()
+    assert inner['report']['children'][0]['name'] == 'as_pdf bundle'
+    assert timing_report()['children'][0]['name'] == 'as_pdf bundle'
+  finally:
+    stop_timing()
@@ -0,0 +1,44 @@
+import io
+import zipfile
+
+from PyPDF2 import PdfReader
+
+from docassemble.ALDocument.al_document import ALDocumentBundleDict, zip_files
+from docassemble.ALDocument.benchmark import make_bundle, make_document
+from docassemble.ALDocument.local_runtime import blank_pdf
+
+def pages_in(archive, name):
+  return len(PdfReader(io.BytesIO(archive.read(name))).pages)
+
+def test_bundle_archive_names_and_contents():
+  documents = [make_document('doc' + str(index), blank_pdf(pages=index % 3 + 1), filename='motion' if index % 2 else 'exhibit_' + str(index)) for index in range(200)]
+  documents.append(make_document('hidden', blank_pdf(), enabled=False))
+  nested = make_bundle('nested', [make_document('a', blank_pdf()), make_document('b', blank_pdf(pages=2))], filename='motion')
+  bundle = make_bundle('bundle', documents + [nested], filename='court_filing')
+  archive_file = bundle.as_zip()
+  assert archive_file.filename == 'court_filing.zip'
+  with zipfile.ZipFile(archive_file.path()) as archive:
+    names = archive.namelist()
+    assert len(names) == 201
+    assert names[:4] == ['exhibit_0.pdf', 'motion.pdf', 'exhibit_2.pdf', 'motion (2).pdf']
+    assert names[199] == 'motion (100).pdf'
+    # The nested bundle's combined PDF has the same name as the documents
+    assert names[200] == 'motion (101).pdf'
+    assert pages_in(archive, 'motion (101).pdf') == 3
+    assert 'hidden.pdf' not in names
+    assert [pages_in(archive, name) for name in names[:6]] == [1, 2, 3, 1, 2, 3]
+    assert archive.testzip() is None
+
+def test_zip_files_numbers_names_with_extensions():
+  files = [blank_pdf(filename='notice.pdf'), blank_pdf(filename='notice.pdf'), blank_pdf(filename='notice'), blank_pdf(filename='notice.pdf')]
+  archive_file = zip_files(iter(files), filename='all.zip')
+  with zipfile.ZipFile(archive_file.path()) as archive:
+    assert archive.namelist() == ['notice.pdf', 'notice (2).pdf', 'notice', 'notice (3).pdf']
+
+def test_bundle_dict_as_zip():
+  bundles = ALDocumentBundleDict('bundles')
+  bundles['court_bundle'] = make_bundle('court_bundle', [make_document('doc', blank_pdf())])
+  archive_file = bundles.as_zip(filename='mine.zip')
+  assert archive_file.filename == 'mine.zip'
+  with zipfile.ZipFile(archive_file.path()) as archive:
+    assert archive.namelist() == ['doc.pdf']